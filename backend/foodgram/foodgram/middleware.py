@@ -0,0 +1,162 @@
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_HISTORY_SIZE = 1000
+TOP_DUPLICATES = 5
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def fingerprint(sql):
+    """SQL без параметров; списки IN (%s, %s, ...) схлопываются."""
+    return PLACEHOLDER_LIST.sub('%s, ...', sql)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+    return ordered[index]
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper: считает запросы, их время и отпечатки."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items()
+                if count > 1}
+
+
+class EndpointMetrics:
+    """
+    Скользящие выборки по эндпоинтам, общие для потоков процесса.
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE):
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._samples = defaultdict(
+            lambda: deque(maxlen=self.history_size))
+        self._duplicates = defaultdict(Counter)
+
+    def add(self, endpoint, total, db, queries, duplicates):
+        with self._lock:
+            self._samples[endpoint].append((total, db, queries))
+            self._duplicates[endpoint].update(duplicates)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._duplicates.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {key: list(value)
+                       for key, value in self._samples.items()}
+            duplicates = {key: value.most_common(TOP_DUPLICATES)
+                          for key, value in self._duplicates.items()}
+        result = {}
+        for endpoint, rows in samples.items():
+            total, db, queries = zip(*rows)
+            result[endpoint] = {
+                'count': len(rows),
+                'total_ms': self._summary(total),
+                'db_ms': self._summary(db),
+                'queries': {
+                    'mean': round(sum(queries) / len(queries), 2),
+                    'max': max(queries),
+                },
+                'duplicate_queries': [
+                    {'sql': sql, 'count': count}
+                    for sql, count in duplicates.get(endpoint, [])
+                ],
+            }
+        return result
+
+    @staticmethod
+    def _summary(values):
+        return {
+            'p50': round(percentile(values, 50), 3),
+            'p95': round(percentile(values, 95), 3),
+            'p99': round(percentile(values, 99), 3),
+            'max': round(max(values), 3),
+        }
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def get_endpoint_name(view_func, request):
+    """
+    Имя эндпоинта вида RecipeViewSet.list или
+    CustomUserViewSet.subscriptions.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class RequestMetricsMiddleware:
+    """
+    Считает число и время запросов к базе, повторяющиеся запросы (N+1)
+    и время Python-кода для доли запросов REQUEST_METRICS['SAMPLE_RATE'].
+    Добавляет заголовок Server-Timing и копит статистику по эндпоинтам.
+    """
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'REQUEST_METRICS', {})
+        if not config.get('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config.get('SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        endpoint_metrics.history_size = config.get(
+            'HISTORY_SIZE', DEFAULT_HISTORY_SIZE)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total = (time.perf_counter() - started) * 1000
+        db = recorder.duration * 1000
+        duplicates = recorder.duplicates()
+
+        response['Server-Timing'] = (
+            f'db;dur={db:.1f};desc="{recorder.count} queries", '
+            f'app;dur={total - db:.1f}, '
+            f'total;dur={total:.1f}'
+        )
+        endpoint = getattr(request, 'metrics_endpoint', None)
+        if endpoint is not None:
+            endpoint_metrics.add(
+                endpoint, total, db, recorder.count, duplicates
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_endpoint = get_endpoint_name(view_func, request)
@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db import close_old_connections
+
+READ_POOL = 'read'
+CPU_POOL = 'cpu'
+DEFAULT_POOLS = {READ_POOL: 8, CPU_POOL: 2}
+SPOOL_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(pool):
+    """Пул потоков из ASYNC_POOLS: число потоков ограничено настройкой."""
+    executor = _executors.get(pool)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(pool)
+            if executor is None:
+                sizes = getattr(settings, 'ASYNC_POOLS', DEFAULT_POOLS)
+                executor = _executors[pool] = ThreadPoolExecutor(
+                    max_workers=sizes.get(pool, DEFAULT_POOLS[pool]),
+                    thread_name_prefix=f'offload-{pool}',
+                )
+    return executor
+
+
+def _call(func, args, kwargs):
+    # Соединения потоков пула живут по тем же правилам CONN_MAX_AGE,
+    # что и соединения обычных запросов.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(pool, func, *args, **kwargs):
+    """Выполняет синхронную функцию в пуле pool, не занимая цикл событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(pool), _call, func, args, kwargs
+    )
+
+
+def spool_streaming_content(response):
+    """
+    Дочитывает потоковый ответ в пуле: генератор может ходить в базу,
+    а ASGI-обработчик Django 3.2 перебирает его прямо в цикле событий.
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    for chunk in response.streaming_content:
+        spool.write(chunk)
+    spool.seek(0)
+    response.streaming_content = iter(lambda: spool.read(CHUNK_SIZE), b'')
+    response._resource_closers.append(spool.close)
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    if response.streaming:
+        spool_streaming_content(response)
+    return response
+
+
+def offloaded(view, pool=READ_POOL, write_pool=CPU_POOL):
+    """
+    Асинхронная обёртка синхронной вьюхи для ASGI: чтение выполняется
+    в пуле pool, запросы с телом - в write_pool. Сам запрос ждёт в
+    цикле событий и не держит поток, пока медленный клиент передаёт
+    тело или забирает ответ.
+    """
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        selected = pool if request.method in ('GET', 'HEAD') else write_pool
+        return await run_in_pool(
+            selected, render_view, view, request, *args, **kwargs
+        )
+
+    return async_view
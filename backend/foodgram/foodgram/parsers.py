@@ -0,0 +1,44 @@
+import io
+import json
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+UTF8 = ('utf-8', 'utf8')
+
+
+def loads(data):
+    """
+    Разбирает JSON из bytes через orjson, если он установлен. То, что
+    orjson не принимает (например, одиночные суррогаты), разбирает
+    стандартный json, так что результат и ошибки остаются прежними.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser, который для UTF-8 сначала пробует orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower() not in UTF8:
+            return super().parse(stream, media_type, parser_context)
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Текст ошибки и поведение на краевых случаях - как у DRF.
+            return super().parse(
+                io.BytesIO(data), media_type, parser_context
+            )
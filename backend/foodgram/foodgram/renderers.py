@@ -0,0 +1,49 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Даты отдаются в default, чтобы формат совпадал с JSONEncoder DRF.
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson else 0
+)
+LINE_SEPARATORS = (
+    (b'\xe2\x80\xa8', b'\\u2028'),
+    (b'\xe2\x80\xa9', b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен. Вывод совпадает с
+    JSONRenderer байт в байт: типы, которых orjson не знает, и даты
+    сериализует encoder_class DRF, а всё, на чём orjson падает (ключи
+    не строки, int больше 64 бит), и вывод с отступами рендерит
+    родительский класс. Отличие одно: NaN и бесконечность orjson пишет
+    как null, а JSONRenderer на них падает.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact
+                or self.ensure_ascii or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except TypeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if b'\xe2\x80' in ret:
+            for separator, escaped in LINE_SEPARATORS:
+                ret = ret.replace(separator, escaped)
+        return ret
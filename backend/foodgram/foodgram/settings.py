@@ -26,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +55,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
 """
 DATABASES = {
     "default": {
@@ -75,6 +77,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'
@@ -108,7 +120,83 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# TTF с кириллицей для PDF списка покупок; в образе - DejaVu Sans.
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    default=os.path.join(BASE_DIR, 'data', 'Handicraft.ttf'),
+)
+
+SHOPPING_LIST_CACHE = {
+    'BACKEND': os.getenv(
+        'SHOPPING_LIST_CACHE_BACKEND',
+        default='recipes.doc_cache.MemoryDocumentStore',
+    ),
+    'LOCATION': os.path.join(BASE_DIR, 'cache', 'shopping_lists'),
+    'MAX_SIZE': 32 * 1024 * 1024,
+    'MAX_ROWS': 500,
+    'TIMEOUT': 300,
+}
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+COOK_SEARCH_LIMIT = 1000
+
+RECIPE_BATCH_LIMIT = 100
+
+IMAGE_PIPELINE = {
+    'QUEUE': os.getenv('IMAGE_QUEUE', default='recipes.images.ThreadPoolQueue'),
+    'WORKERS': int(os.getenv('IMAGE_WORKERS', default=2)),
+    'VARIANTS': {'small': 240, 'medium': 600, 'large': 1200},
+    'QUALITY': 80,
+}
+
+RECIPE_IMAGE_UPLOAD = {
+    'MAX_BYTES': int(os.getenv('RECIPE_IMAGE_MAX_BYTES', default=10485760)),
+    'MAX_PIXELS': 40000000,
+    'MAX_JSON_BYTES': 1048576,
+    'FORMATS': ('JPEG', 'PNG', 'GIF', 'WEBP'),
+}
+
+RECIPE_CACHE_TIMEOUT = 600
+
+USER_RELATIONS_TIMEOUT = 3600
+
+# Быстрый путь чтения: ответы собираются из values() без сериализаторов.
+FAST_READ = {
+    'RECIPE_LIST': True,
+    'RECIPE_DETAIL': True,
+    'SUBSCRIPTIONS': True,
+}
+
+REFERENCE_MAX_AGE = int(os.getenv('REFERENCE_MAX_AGE', default=0))
+
+RECIPE_TRENDING_HALF_LIFE_DAYS = float(
+    os.getenv('RECIPE_TRENDING_HALF_LIFE_DAYS', default=7)
+)
+
+REQUEST_METRICS = {
+    'ENABLED': os.getenv('REQUEST_METRICS_ENABLED', default='') == 'true',
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', default=1)),
+    'HISTORY_SIZE': 1000,
+}
+
+# Асинхронные обёртки для foodgram.asgi: без ASGI они только мешают.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='') == 'true'
+ASYNC_POOLS = {
+    'read': int(os.getenv('ASYNC_READ_WORKERS', default=8)),
+    'cpu': int(os.getenv('ASYNC_CPU_WORKERS', default=2)),
+}
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'foodgram.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication'
     ],
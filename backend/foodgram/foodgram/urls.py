@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .views import request_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/metrics/', request_metrics, name='request_metrics'),
     path('api/', include('users.urls')),
     path('api/', include('recipes.urls')),
     path('auth/', include('django.contrib.auth.urls')),
@@ -0,0 +1,14 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .middleware import endpoint_metrics
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    """Статистика RequestMetricsMiddleware по эндпоинтам этого процесса."""
+    if request.method == 'DELETE':
+        endpoint_metrics.clear()
+    return Response(endpoint_metrics.snapshot())
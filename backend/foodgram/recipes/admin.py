@@ -20,8 +20,9 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
     inlines = (RecipeIngredientsInLine,)
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorite(self, obj):
-        return obj.in_favorite.all().count()
+        return obj.favorites_count
 
 
 @admin.register(models.Ingredient)
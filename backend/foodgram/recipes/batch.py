@@ -0,0 +1,99 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .counters import count_subquery
+from .exports import invalidate_shopping_lists
+from .models import Favorite, Recipe, ShoppingCart
+from .relations import CART, FAVORITES, update_relations
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+RELATION_KINDS = {
+    Favorite: FAVORITES,
+    ShoppingCart: CART,
+}
+ADDED = 'added'
+ALREADY_ADDED = 'already_added'
+REMOVED = 'removed'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+# Какие строки действительно добавлены и удалены, сообщает RETURNING
+# самой записи, а не SELECT перед ней: параллельный запрос не исказит
+# статусы. Несуществующие рецепты отсекает INSERT ... SELECT, а не
+# внешний ключ. Нужны PostgreSQL или SQLite 3.35+.
+INSERT_SQL = (
+    'INSERT INTO {table} (user_id, recipe_id, create_at) '
+    'SELECT %s, id, %s FROM {recipes} WHERE id IN ({ids}) '
+    'ON CONFLICT DO NOTHING RETURNING recipe_id'
+)
+DELETE_SQL = (
+    'DELETE FROM {table} WHERE user_id = %s AND recipe_id IN ({ids}) '
+    'RETURNING recipe_id'
+)
+
+
+def _returning(sql, model, params, recipe_ids):
+    """Выполняет sql для recipe_ids и возвращает id из RETURNING."""
+    if not recipe_ids:
+        return set()
+    quote = connection.ops.quote_name
+    sql = sql.format(
+        table=quote(model._meta.db_table),
+        recipes=quote(Recipe._meta.db_table),
+        ids=', '.join(['%s'] * len(recipe_ids)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, *recipe_ids])
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+def apply_batch(model, user, add, remove):
+    """
+    Добавляет рецепты add в избранное или список покупок пользователя
+    и убирает оттуда рецепты remove фиксированным числом запросов.
+    Возвращает список {'id': ..., 'status': ...} в порядке запроса.
+
+    Массовые операции не отправляют сигналов, поэтому счётчики рецептов,
+    связи пользователя и кэш списка покупок обновляются здесь же.
+    """
+    with transaction.atomic():
+        existing = set(Recipe.objects.filter(
+            pk__in=[*add, *remove]
+        ).values_list('pk', flat=True))
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        created = _returning(INSERT_SQL, model, [user.pk, now], add)
+        removed = _returning(DELETE_SQL, model, [user.pk], remove)
+        changed = created | removed
+        if changed:
+            field = RECIPE_COUNTERS[model]
+            Recipe.objects.filter(pk__in=changed).update(**{
+                field: count_subquery(model, 'recipe'),
+                'score_dirty': True,
+            })
+            update_relations(
+                user.pk, RELATION_KINDS[model],
+                add=sorted(created), remove=sorted(removed),
+            )
+    if changed and model is ShoppingCart:
+        invalidate_shopping_lists([user.pk])
+
+    return _statuses(add, remove, existing, created, removed)
+
+
+def _statuses(add, remove, existing, created, removed):
+    results = []
+    for pk in add:
+        if pk in created:
+            status = ADDED
+        else:
+            status = ALREADY_ADDED if pk in existing else NOT_FOUND
+        results.append({'id': pk, 'status': status})
+    for pk in remove:
+        if pk in removed:
+            status = REMOVED
+        else:
+            status = NOT_ADDED if pk in existing else NOT_FOUND
+        results.append({'id': pk, 'status': status})
+    return results
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Поколения кэшей лежат в базе, но сами записи (ответы для анонимов,
+    связи пользователей, списки покупок) с LocMemCache копятся в каждом
+    воркере отдельно и хуже попадают в кэш.
+    """
+    if settings.CACHES['default']['BACKEND'] != LOCMEM_BACKEND:
+        return []
+    return [Warning(
+        'Кэш по умолчанию - LocMemCache, у каждого воркера свой.',
+        hint='Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION, '
+             'например memcached, как в infra/docker-compose.yml.',
+        id='recipes.W001',
+    )]
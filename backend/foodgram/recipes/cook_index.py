@@ -0,0 +1,196 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Q
+
+from .models import CookIndexChange, Recipe, RecipeIngredient
+
+# Изменения хранятся в базе как журнал CookIndexChange, общий для всех
+# процессов. Если процесс отстал сильнее, в журнале есть пропуск или
+# запись о полной перестройке, индекс строится заново.
+MAX_PENDING_CHANGES = 1000
+PRUNE_INTERVAL = 100
+
+
+def _recipe_ingredients(recipe_ids=None):
+    rows = RecipeIngredient.objects.order_by().values_list(
+        'recipe_id', 'ingredient_id'
+    )
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    result = defaultdict(set)
+    for recipe_id, ingredient_id in rows.iterator():
+        result[recipe_id].add(ingredient_id)
+    return result
+
+
+def record_change(recipe_id):
+    """
+    Добавляет рецепт в журнал изменений индекса. Вызывается после
+    коммита, поэтому запись журнала появляется позже данных рецепта.
+    """
+    change = CookIndexChange.objects.create(recipe_id=recipe_id)
+    if change.pk % PRUNE_INTERVAL == 0:
+        CookIndexChange.objects.filter(
+            pk__lte=change.pk - MAX_PENDING_CHANGES
+        ).delete()
+
+
+def rank(candidates, max_missing, limit):
+    """
+    Сортирует тройки (id, покрыто, всего) по доле покрытых ингредиентов,
+    затем по числу покрытых и по новизне рецепта.
+    """
+    if max_missing is not None:
+        candidates = (
+            row for row in candidates if row[2] - row[1] <= max_missing
+        )
+    return heapq.nsmallest(
+        limit, candidates,
+        key=lambda row: (-row[1] / row[2], -row[1], -row[0]),
+    )
+
+
+class CookIndex:
+    """
+    Инвертированный индекс в памяти процесса: id ингредиента ->
+    отсортированный массив id рецептов. Обновляется по журналу
+    изменений в базе, поэтому правка рецепта не перестраивает
+    индекс целиком.
+    """
+
+    def __init__(self):
+        self._state = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def current_generation():
+        return CookIndexChange.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+
+    @staticmethod
+    def invalidate():
+        """Полная перестройка, например после bulk-загрузки рецептов."""
+        CookIndexChange.objects.create(recipe_id=None)
+
+    def build(self, generation):
+        recipes = _recipe_ingredients()
+        postings = defaultdict(list)
+        for recipe_id in sorted(recipes):
+            for ingredient_id in recipes[recipe_id]:
+                postings[ingredient_id].append(recipe_id)
+        self._state = {
+            'generation': generation,
+            'postings': {
+                ingredient_id: array('q', recipe_ids)
+                for ingredient_id, recipe_ids in postings.items()
+            },
+            'totals': {
+                recipe_id: len(ingredients)
+                for recipe_id, ingredients in recipes.items()
+            },
+            'recipes': {
+                recipe_id: frozenset(ingredients)
+                for recipe_id, ingredients in recipes.items()
+            },
+        }
+
+    def _pending_changes(self, state, generation):
+        start = state['generation']
+        if not 0 <= generation - start <= MAX_PENDING_CHANGES:
+            return None
+        changes = set(CookIndexChange.objects.filter(
+            pk__gt=start, pk__lte=generation
+        ).values_list('pk', 'recipe_id'))
+        recipe_ids = {recipe_id for _, recipe_id in changes}
+        if len(changes) != generation - start or None in recipe_ids:
+            return None
+        return recipe_ids
+
+    def apply(self, state, recipe_ids, generation):
+        """
+        Переносит в индекс текущие ингредиенты рецептов recipe_ids.
+        Изменённые массивы заменяются копиями, чтобы параллельный
+        поиск не видел их наполовину обновлёнными.
+        """
+        current = _recipe_ingredients(recipe_ids)
+        postings = state['postings']
+        for recipe_id in recipe_ids:
+            old = state['recipes'].pop(recipe_id, frozenset())
+            new = frozenset(current.get(recipe_id, ()))
+            for ingredient_id in old - new:
+                recipes = array('q', postings.get(ingredient_id, ()))
+                position = bisect_left(recipes, recipe_id)
+                if (position < len(recipes)
+                        and recipes[position] == recipe_id):
+                    del recipes[position]
+                postings[ingredient_id] = recipes
+            for ingredient_id in new - old:
+                recipes = array('q', postings.get(ingredient_id, ()))
+                insort(recipes, recipe_id)
+                postings[ingredient_id] = recipes
+            if new:
+                state['recipes'][recipe_id] = new
+                state['totals'][recipe_id] = len(new)
+            else:
+                state['totals'].pop(recipe_id, None)
+        state['generation'] = generation
+
+    def _warm_state(self):
+        generation = self.current_generation()
+        state = self._state
+        if state is not None and state['generation'] == generation:
+            return state
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            state = self._state
+            changes = None
+            if state is not None:
+                changes = self._pending_changes(state, generation)
+            if changes is None:
+                self.build(generation)
+            else:
+                self.apply(state, changes, generation)
+        finally:
+            self._lock.release()
+        return self._state
+
+    def search(self, ingredient_ids, max_missing, limit):
+        """
+        Возвращает до limit троек (id рецепта, покрыто, всего).
+        Пока индекс обновляется в другом потоке, возвращает None.
+        """
+        state = self._warm_state()
+        if state is None:
+            return None
+        covered = Counter()
+        for ingredient_id in set(ingredient_ids):
+            covered.update(state['postings'].get(ingredient_id, ()))
+        totals = state['totals']
+        candidates = (
+            (recipe_id, count, totals.get(recipe_id))
+            for recipe_id, count in covered.items()
+        )
+        return rank(
+            (row for row in candidates if row[2]), max_missing, limit
+        )
+
+
+def search_database(ingredient_ids, max_missing, limit):
+    """Тот же поиск через GROUP BY, пока индекс не готов."""
+    rows = Recipe.objects.order_by().annotate(
+        total=Count('recipe_ingredient'),
+        covered=Count(
+            'recipe_ingredient',
+            filter=Q(recipe_ingredient__ingredient__in=ingredient_ids),
+        ),
+    ).filter(covered__gt=0).values_list('id', 'covered', 'total')
+    return rank(rows.iterator(), max_missing, limit)
+
+
+cook_index = CookIndex()
@@ -0,0 +1,43 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def change_counter(queryset, field, delta, **extra):
+    """
+    Атомарно меняет счётчик на delta через F(), не уходя ниже нуля.
+    extra обновляются тем же UPDATE.
+    """
+    return queryset.update(
+        **{field: Greatest(F(field) + delta, Value(0))}, **extra
+    )
+
+
+def count_subquery(model, field):
+    """Подзапрос COUNT(*) строк model, ссылающихся на внешний pk."""
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def recount(queryset, counters, batch_size):
+    """
+    Пересчитывает счётчики пачками по диапазонам pk.
+    counters - словарь {поле счётчика: (модель, поле внешнего ключа)}.
+    """
+    values = {
+        field: count_subquery(model, fk)
+        for field, (model, fk) in counters.items()
+    }
+    queryset = queryset.order_by('pk')
+    last_pk = 0
+    updated = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).values_list(
+            'pk', flat=True)[:batch_size])
+        if not pks:
+            return updated
+        updated += queryset.filter(
+            pk__gte=pks[0], pk__lte=pks[-1]
+        ).update(**values)
+        last_pk = pks[-1]
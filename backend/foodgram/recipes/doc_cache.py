@@ -0,0 +1,150 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_MAX_SIZE = 32 * 1024 * 1024
+
+
+class BaseDocumentStore(ABC):
+    """
+    Хранилище сгенерированных документов по ключу содержимого.
+    Суммарный размер ограничен max_size, вытесняются давно не
+    запрашиваемые документы (LRU).
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, **options):
+        self.max_size = max_size
+
+    @abstractmethod
+    def get(self, key):
+        """Документ по ключу или None."""
+
+    @abstractmethod
+    def set(self, key, content):
+        """Сохраняет документ, если он не больше max_size."""
+
+    @abstractmethod
+    def clear(self):
+        """Удаляет все документы."""
+
+
+class MemoryDocumentStore(BaseDocumentStore):
+    """Хранилище в памяти процесса."""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, **options):
+        super().__init__(max_size, **options)
+        self._documents = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            content = self._documents.get(key)
+            if content is not None:
+                self._documents.move_to_end(key)
+            return content
+
+    def set(self, key, content):
+        if len(content) > self.max_size:
+            return
+        with self._lock:
+            old = self._documents.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._documents[key] = content
+            self._size += len(content)
+            while self._size > self.max_size:
+                _, evicted = self._documents.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._size = 0
+
+
+class FileDocumentStore(BaseDocumentStore):
+    """
+    Хранилище в каталоге на диске, общее для воркеров одного сервера.
+    Время последнего обращения хранится в mtime файла.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, location=None, **options):
+        super().__init__(max_size, **options)
+        self.location = location
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as document:
+                content = document.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def set(self, key, content):
+        if len(content) > self.max_size:
+            return
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as document:
+            document.write(content)
+        os.replace(tmp_path, path)
+        self._cull()
+
+    def _cull(self):
+        entries = []
+        total = 0
+        with os.scandir(self.location) as files:
+            for entry in files:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        with os.scandir(self.location) as files:
+            for entry in files:
+                os.remove(entry.path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_document_store():
+    """Возвращает хранилище, настроенное в SHOPPING_LIST_CACHE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'SHOPPING_LIST_CACHE', {})
+                backend = import_string(config.get(
+                    'BACKEND', 'recipes.doc_cache.MemoryDocumentStore'))
+                _store = backend(
+                    max_size=config.get('MAX_SIZE', DEFAULT_MAX_SIZE),
+                    location=config.get('LOCATION'),
+                )
+    return _store
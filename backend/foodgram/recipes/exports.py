@@ -0,0 +1,274 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .doc_cache import get_document_store
+from .generations import bump_generation, bump_generations, get_generations
+from .models import RecipeIngredient
+
+FONT_NAME = 'ShoppingList'
+FALLBACK_FONT_NAME = 'Helvetica'
+
+TITLE = 'Список покупок'
+FILENAME = 'shopping_list'
+CHUNK_SIZE = 8192
+ITERATOR_CHUNK_SIZE = 500
+SPOOL_MAX_SIZE = 1024 * 1024
+
+POINTER_KEY = (
+    'shopping_list:{generation}:{user_id}:{user_generation}:{file_format}'
+)
+GENERATION_KEY = 'shopping_list:generation'
+USER_GENERATION_KEY = 'shopping_list:{user_id}:generation'
+DEFAULT_POINTER_TIMEOUT = 300
+DEFAULT_MAX_ROWS = 500
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+TOP_MARGIN = 50
+BOTTOM_MARGIN = 50
+LEFT_MARGIN = 75
+LINE_HEIGHT = 25
+
+_font_name = FALLBACK_FONT_NAME
+
+logger = logging.getLogger(__name__)
+
+
+def register_font():
+    """
+    Регистрирует шрифт списка покупок из SHOPPING_LIST_FONT.
+    Вызывается один раз при старте приложения из RecipesConfig.ready().
+    Встроенная Helvetica не рисует кириллицу, поэтому без шрифта
+    в лог пишется предупреждение.
+    """
+    global _font_name
+    path = settings.SHOPPING_LIST_FONT
+    if not os.path.exists(path):
+        logger.warning(
+            'Шрифт списка покупок %s не найден, PDF будет без кириллицы. '
+            'Укажите TTF-файл с кириллицей в SHOPPING_LIST_FONT.', path
+        )
+        return
+    pdfmetrics.registerFont(TTFont(FONT_NAME, path, 'UTF-8'))
+    _font_name = FONT_NAME
+
+
+def get_shopping_list(user):
+    """
+    Суммирует ингредиенты из корзины пользователя одним
+    сгруппированным запросом.
+    """
+    return RecipeIngredient.objects.filter(
+        recipe__customers__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total=Sum('amount')
+    ).order_by('ingredient__name')
+
+
+def _lines(rows):
+    for number, row in enumerate(rows, 1):
+        yield (f'{number}. {row["ingredient__name"]} - {row["total"]} '
+               f'{row["ingredient__measurement_unit"]}')
+
+
+def render_txt(rows):
+    yield f'{TITLE}\n\n'
+    for line in _lines(rows):
+        yield f'{line}\n'
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow((
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['total'],
+        ))
+
+
+def render_pdf(rows):
+    """
+    Рисует список постранично во временный файл и отдаёт его кусками.
+    ReportLab собирает документ целиком, поэтому большой файл
+    сбрасывается на диск, а не держится в памяти.
+    """
+    with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buffer:
+        page = canvas.Canvas(buffer, pagesize=A4)
+        page.setFont(_font_name, size=24)
+        page.drawString(200, PAGE_HEIGHT - TOP_MARGIN, TITLE)
+        page.setFont(_font_name, size=16)
+        height = PAGE_HEIGHT - TOP_MARGIN - 2 * LINE_HEIGHT
+        for line in _lines(rows):
+            if height < BOTTOM_MARGIN:
+                page.showPage()
+                page.setFont(_font_name, size=16)
+                height = PAGE_HEIGHT - TOP_MARGIN
+            page.drawString(LEFT_MARGIN, height, line)
+            height -= LINE_HEIGHT
+        page.showPage()
+        page.save()
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+EXPORT_FORMATS = {
+    'pdf': (render_pdf, 'application/pdf'),
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def _pointer_key(user_id, file_format):
+    generation, user_generation = get_generations(
+        GENERATION_KEY, USER_GENERATION_KEY.format(user_id=user_id)
+    )
+    return POINTER_KEY.format(
+        generation=generation,
+        user_id=user_id,
+        user_generation=user_generation,
+        file_format=file_format,
+    )
+
+
+def invalidate_shopping_lists(user_ids):
+    """
+    Сбрасывает указатели на документы для пользователей. Поколения
+    лежат в базе, поэтому сброс видят все процессы.
+    """
+    bump_generations(
+        USER_GENERATION_KEY.format(user_id=user_id) for user_id in user_ids
+    )
+
+
+def invalidate_all_shopping_lists():
+    """Сбрасывает указатели всех пользователей, например при смене
+    названия ингредиента."""
+    bump_generation(GENERATION_KEY)
+
+
+def _digest(rows, file_format):
+    payload = json.dumps([file_format, rows], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _render(renderer, rows):
+    return b''.join(
+        chunk.encode() if isinstance(chunk, str) else chunk
+        for chunk in renderer(rows)
+    )
+
+
+def _set_headers(response, file_format, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    response['Content-Disposition'] = (
+        f'attachment; filename="{FILENAME}.{file_format}"'
+    )
+    return response
+
+
+def _limited_rows(user, limit):
+    """
+    Строки списка, если их не больше limit, иначе None: большой
+    список отдаётся потоком мимо кэша документов.
+    """
+    rows = list(islice(
+        get_shopping_list(user).iterator(chunk_size=ITERATOR_CHUNK_SIZE),
+        limit + 1,
+    ))
+    return rows if len(rows) <= limit else None
+
+
+def cached_shopping_list_response(request, file_format):
+    """
+    Отдаёт список покупок из хранилища документов.
+    Ключ документа - хэш содержимого корзины и формата, поэтому
+    одинаковые корзины разных пользователей делят один документ.
+    Указатель пользователь -> ключ лежит в кэше Django и сбрасывается
+    сигналами при изменении корзины или ингредиентов рецептов в ней.
+    Кэшируются только списки до MAX_ROWS строк, остальные
+    отдаются потоком, как без кэша. Возвращает None для потока.
+    """
+    renderer, content_type = EXPORT_FORMATS[file_format]
+    config = getattr(settings, 'SHOPPING_LIST_CACHE', {})
+    max_rows = config.get('MAX_ROWS', DEFAULT_MAX_ROWS)
+    pointer_key = _pointer_key(request.user.id, file_format)
+    pointer = cache.get(pointer_key)
+    rows = None
+    if pointer is None:
+        rows = _limited_rows(request.user, max_rows)
+        if rows is None:
+            return None
+        pointer = (_digest(rows, file_format), time.time())
+        cache.set(
+            pointer_key, pointer,
+            config.get('TIMEOUT', DEFAULT_POINTER_TIMEOUT),
+        )
+    digest, last_modified = pointer
+    etag = quote_etag(digest)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if not_modified is not None:
+        return _set_headers(not_modified, file_format, etag, last_modified)
+
+    store = get_document_store()
+    content = store.get(digest)
+    if content is None:
+        if rows is None:
+            rows = _limited_rows(request.user, max_rows)
+            if rows is None:
+                return None
+        content = _render(renderer, rows)
+        store.set(digest, content)
+    response = HttpResponse(content, content_type=content_type)
+    return _set_headers(response, file_format, etag, last_modified)
+
+
+def shopping_list_response(request, file_format):
+    if getattr(settings, 'SHOPPING_LIST_CACHE', None):
+        response = cached_shopping_list_response(request, file_format)
+        if response is not None:
+            return response
+    renderer, content_type = EXPORT_FORMATS[file_format]
+    rows = get_shopping_list(request.user).iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE)
+    response = StreamingHttpResponse(
+        renderer(rows), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{FILENAME}.{file_format}"'
+    )
+    return response
@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+from django.conf import settings
+
+from .images import file_url
+from .models import Recipe, RecipeIngredient
+from .relations import CART, FAVORITES, FOLLOWING, get_relations
+
+RECIPE_FIELDS = (
+    'id', 'name', 'image', 'image_variants', 'text', 'cooking_time',
+    'create_at', 'author_id', 'author__email', 'author__username',
+    'author__first_name', 'author__last_name',
+)
+SHORT_RECIPE_FIELDS = (
+    'id', 'name', 'image', 'image_variants', 'cooking_time', 'author_id',
+)
+DETAIL_IMAGE_VARIANT = 'large'
+SHORT_IMAGE_VARIANT = 'small'
+
+
+def fast_read_enabled(endpoint):
+    """Включён ли быстрый путь чтения для эндпоинта из FAST_READ."""
+    return getattr(settings, 'FAST_READ', {}).get(endpoint, False)
+
+
+def image_url(row, variant, request):
+    """Как ImageVariantField, но по строке values()."""
+    url = file_url(row['image'], row['image_variants'], variant)
+    if url is None or request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def recipe_tags(recipe_ids):
+    tags = defaultdict(list)
+    rows = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    )
+    for recipe_id, pk, name, color, slug in rows:
+        tags[recipe_id].append(
+            {'id': pk, 'name': name, 'color': color, 'slug': slug}
+        )
+    return tags
+
+
+def recipe_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('recipe', 'id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount',
+    )
+    for recipe_id, pk, name, unit, amount in rows:
+        ingredients[recipe_id].append({
+            'id': pk, 'name': name, 'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def recipe_data(rows, context):
+    """
+    Данные RecipeReadSerializer по строкам Recipe.objects.values(
+    *RECIPE_FIELDS): словари строятся напрямую, без полей DRF и
+    экземпляров моделей. Теги и ингредиенты - два запроса на страницу.
+    """
+    request = context.get('request')
+    relations = get_relations(request)
+    variant = context.get('image_variant', DETAIL_IMAGE_VARIANT)
+    ids = [row['id'] for row in rows]
+    tags = recipe_tags(ids)
+    ingredients = recipe_ingredients(ids)
+    return [
+        {
+            'id': row['id'],
+            'tags': tags[row['id']],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': relations.has(FOLLOWING, row['author_id']),
+            },
+            'ingredients': ingredients[row['id']],
+            'is_favorited': relations.has(FAVORITES, row['id']),
+            'is_in_shopping_cart': relations.has(CART, row['id']),
+            'name': row['name'],
+            'image': image_url(row, variant, request),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+        for row in rows
+    ]
+
+
+def short_recipe_data(row, request):
+    """Данные RecipeSubSerializer по строке values(*SHORT_RECIPE_FIELDS)."""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'image': image_url(row, SHORT_IMAGE_VARIANT, request),
+        'cooking_time': row['cooking_time'],
+    }
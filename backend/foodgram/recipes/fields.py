@@ -0,0 +1,49 @@
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from .images import variant_url
+
+
+class ImageVariantField(serializers.Field):
+    """
+    URL уменьшенной копии картинки рецепта. Вариант берётся из
+    context['image_variant'], если вьюсет его задал, иначе variant.
+    Пока копии не готовы, отдаётся исходная картинка.
+    """
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        url = variant_url(
+            recipe, self.context.get('image_variant', self.variant)
+        )
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+
+class StreamedBase64ImageField(Base64ImageField):
+    """
+    Base64ImageField, который принимает и файл, уже декодированный
+    RecipeJSONParser. Формат и размеры парсер проверил по заголовку,
+    здесь картинка проверяется целиком прямо из временного файла.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        try:
+            with Image.open(data) as image:
+                image.verify()
+        except Exception:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        finally:
+            data.seek(0)
+        return data
@@ -1,10 +1,28 @@
 import django_filters as filters
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
 
-from .models import Ingredient, Recipe, Tag
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .popularity import ORDERINGS
+from .search import search_recipes
+
+USER_FLAG_MODELS = {
+    'is_favorited': Favorite,
+    'is_in_shopping_cart': ShoppingCart,
+}
 
 
 class IngredientNameFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
+    """Сначала ингредиенты, начинающиеся с name, затем содержащие его."""
+    name = filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        return queryset.filter(name__icontains=value).annotate(
+            is_substring=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('is_substring', 'name')
 
     class Meta:
         model = Ingredient
@@ -21,25 +39,37 @@ class RecipeFilter(filters.FilterSet):
     is_favorited = filters.NumberFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(
         method='get_is_in_shopping_cart')
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'), ('trending', 'В тренде')),
+        method='get_ordering',
+    )
 
-    def get_is_favorited(self, queryset, name, value):
+    def filter_user_flag(self, queryset, name, value):
+        """Рецепты, которые есть (1) или которых нет (0) у пользователя."""
         if self.request.user.is_anonymous:
             return queryset
-        if value == 1:
-            return queryset.filter(favorite__user=self.request.user)
-        if value == 0:
-            return queryset.exclude(favorite__user=self.request.user)
-        return queryset.none()
+        if value not in (0, 1):
+            return queryset.none()
+        flag = Exists(USER_FLAG_MODELS[name].objects.filter(
+            user=self.request.user, recipe=OuterRef('pk')))
+        return queryset.filter(flag if value else ~flag)
+
+    def get_is_favorited(self, queryset, name, value):
+        return self.filter_user_flag(queryset, name, value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if self.request.user.is_anonymous:
-            return queryset
-        if value == 1:
-            return queryset.filter(shoppinglist__user=self.request.user)
-        if value == 0:
-            return queryset.exclude(shoppinglist__user=self.request.user)
-        return queryset.none()
+        return self.filter_user_flag(queryset, name, value)
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск, самые релевантные рецепты первыми."""
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        """Сортировка по заранее посчитанным рейтингам."""
+        return queryset.order_by(*ORDERINGS[value])
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering',)
@@ -0,0 +1,66 @@
+import time
+
+from django.db.models import F
+
+from .models import Generation
+
+BATCH_SIZE = 500
+
+
+def _initial_generation():
+    # Новый счётчик не совпадёт со значениями, под которыми в общем
+    # кэше могли остаться записи, например после пересоздания базы.
+    return time.time_ns()
+
+
+def get_generations(*keys):
+    """
+    Текущие значения счётчиков поколений одним запросом, создавая
+    отсутствующие.
+    """
+    values = dict(
+        Generation.objects.filter(key__in=keys).values_list('key', 'value')
+    )
+    missing = [key for key in keys if key not in values]
+    if missing:
+        Generation.objects.bulk_create(
+            [Generation(key=key, value=_initial_generation())
+             for key in missing],
+            ignore_conflicts=True,
+        )
+        values.update(Generation.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+    return [values[key] for key in keys]
+
+
+def get_generation(key):
+    return get_generations(key)[0]
+
+
+def bump_generation(key):
+    """
+    Увеличивает счётчик поколения. Ключи кэша, построенные на старом
+    значении, больше не читаются и вытесняются сами. Внутри транзакции
+    новое значение увидят после коммита.
+    """
+    updated = Generation.objects.filter(key=key).update(value=F('value') + 1)
+    if not updated:
+        Generation.objects.bulk_create(
+            [Generation(key=key, value=_initial_generation())],
+            ignore_conflicts=True,
+        )
+        # Счётчик мог создать параллельный запрос: сдвигаем и его.
+        Generation.objects.filter(key=key).update(value=F('value') + 1)
+
+
+def bump_generations(keys):
+    """
+    Увеличивает несколько счётчиков пачками по запросу. Отсутствующие
+    не создаются: под ними ещё ничего не закэшировано.
+    """
+    keys = list(keys)
+    for start in range(0, len(keys), BATCH_SIZE):
+        Generation.objects.filter(
+            key__in=keys[start:start + BATCH_SIZE]
+        ).update(value=F('value') + 1)
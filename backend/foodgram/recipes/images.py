@@ -0,0 +1,163 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from . import response_cache
+from .models import Recipe
+
+DEFAULT_VARIANTS = {'small': 240, 'medium': 600, 'large': 1200}
+DEFAULT_QUALITY = 80
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 'recipes.images.ThreadPoolQueue'
+VARIANTS_DIR = 'recipes/variants'
+# Ключ, под которым в image_variants лежит имя исходного файла.
+SOURCE_KEY = 'source'
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return getattr(settings, 'IMAGE_PIPELINE', {})
+
+
+def get_variant_sizes():
+    return get_config().get('VARIANTS', DEFAULT_VARIANTS)
+
+
+def run_job(func, *args):
+    """
+    Ошибка обработки только пишется в лог: задача выполняется после
+    коммита, и рецепт к этому времени уже сохранён.
+    """
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', args)
+
+
+class SyncQueue:
+    """Обрабатывает картинку сразу, например в командах и тестах."""
+
+    def enqueue(self, func, *args):
+        run_job(func, *args)
+
+
+class ThreadPoolQueue:
+    """Пул потоков процесса: Pillow отпускает GIL при сжатии и ресайзе."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=get_config().get('WORKERS', DEFAULT_WORKERS),
+            thread_name_prefix='recipe-images',
+        )
+
+    def enqueue(self, func, *args):
+        self.executor.submit(self._run, func, *args)
+
+    @staticmethod
+    def _run(func, *args):
+        try:
+            run_job(func, *args)
+        finally:
+            # У каждого потока своё соединение с базой.
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_queue():
+    """Очередь из IMAGE_PIPELINE['QUEUE'] - путь к классу с enqueue()."""
+    return import_string(get_config().get('QUEUE', DEFAULT_QUEUE))()
+
+
+def needs_variants(recipe):
+    return bool(recipe.image) and (
+        recipe.image_variants.get(SOURCE_KEY) != recipe.image.name
+    )
+
+
+def render_variant(image, size, quality):
+    """WebP, вписанный в квадрат size, без EXIF и прочих метаданных."""
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def open_image(name):
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def process_recipe_image(recipe_id, source):
+    """
+    Строит варианты картинки рецепта и записывает их в image_variants,
+    если за это время картинку не заменили.
+    """
+    image = open_image(source)
+    quality = get_config().get('QUALITY', DEFAULT_QUALITY)
+    digest = hashlib.sha1(source.encode()).hexdigest()[:12]
+    variants = {SOURCE_KEY: source}
+    for name, size in get_variant_sizes().items():
+        variants[name] = default_storage.save(
+            f'{VARIANTS_DIR}/{recipe_id}/{digest}-{name}.webp',
+            ContentFile(render_variant(image, size, quality)),
+        )
+    recipe = Recipe.objects.filter(pk=recipe_id, image=source)
+    previous = recipe.values_list('image_variants', flat=True).first()
+    if not recipe.update(image_variants=variants):
+        # Картинку заменили или рецепт удалили, пока шла обработка.
+        delete_files(variant_files(variants), keep=source)
+        return
+    delete_files(
+        variant_files(previous or {}) - variant_files(variants), keep=source
+    )
+    response_cache.invalidate_recipe(recipe_id)
+
+
+def variant_files(variants):
+    return {path for name, path in variants.items() if name != SOURCE_KEY}
+
+
+def delete_files(paths, keep):
+    for path in paths:
+        if path and path != keep and default_storage.exists(path):
+            default_storage.delete(path)
+
+
+def schedule_variants(recipe):
+    source = recipe.image.name
+    # Без исходного файла обработка падала бы при каждом сохранении,
+    # например у рецептов generate_data или import_recipes, картинки
+    # которых ещё не перенесены.
+    if not default_storage.exists(source):
+        logger.warning('Нет картинки %s рецепта %s', source, recipe.pk)
+        return
+    get_queue().enqueue(process_recipe_image, recipe.pk, source)
+
+
+def variant_url(recipe, variant):
+    """Относительный URL варианта или исходной картинки, если его нет."""
+    return file_url(recipe.image.name, recipe.image_variants, variant)
+
+
+def file_url(image, variants, variant):
+    """То же по имени картинки и image_variants, например из values()."""
+    name = variants.get(variant) or image
+    if not name:
+        return None
+    return default_storage.url(name)
@@ -0,0 +1,80 @@
+import threading
+from bisect import bisect_left
+
+from .generations import bump_generation, get_generation
+from .models import Ingredient
+
+GENERATION_KEY = 'ingredient_index:generation'
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Хранит отсортированный массив названий в casefold и ищет префикс
+    бинарным поиском, после префиксных совпадений добавляет совпадения
+    по подстроке. Поколение лежит в базе, поэтому индекс перестраивается
+    и после загрузки ингредиентов в другом процессе.
+    """
+
+    def __init__(self):
+        self._state = None
+        self._build_lock = threading.Lock()
+
+    @staticmethod
+    def current_generation():
+        return get_generation(GENERATION_KEY)
+
+    @staticmethod
+    def invalidate():
+        bump_generation(GENERATION_KEY)
+
+    def build(self, generation=None):
+        if generation is None:
+            generation = self.current_generation()
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['id']),
+        )
+        keys = [row['name'].casefold() for row in rows]
+        self._state = (generation, keys, rows)
+
+    def _warm_state(self):
+        generation = self.current_generation()
+        state = self._state
+        if state is not None and state[0] == generation:
+            return state
+        if not self._build_lock.acquire(blocking=False):
+            return None
+        try:
+            self.build(generation)
+        finally:
+            self._build_lock.release()
+        return self._state
+
+    def search(self, query, limit):
+        """
+        Возвращает до limit ингредиентов: сначала начинающиеся с query,
+        затем содержащие его. Если индекс перестраивается в другом
+        потоке, возвращает None, и поиск идёт через базу.
+        """
+        state = self._warm_state()
+        if state is None:
+            return None
+        _, keys, rows = state
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = rows[start:min(end, start + limit)]
+        if len(result) < limit:
+            for position, key in enumerate(keys):
+                if start <= position < end or query not in key:
+                    continue
+                result.append(rows[position])
+                if len(result) == limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
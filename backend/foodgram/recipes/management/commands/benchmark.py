@@ -0,0 +1,197 @@
+import json
+import math
+import time
+import tracemalloc
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Tag
+
+User = get_user_model()
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_TOLERANCE = 0.2
+SERVER_NAME = 'localhost'
+METRICS = ('p50_ms', 'p95_ms', 'queries', 'peak_kb')
+# Число запросов к базе не зависит от железа, поэтому сравнивается строго.
+STRICT_METRICS = ('queries',)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные эндпоинты API через тестовый клиент Django и '
+        'считает p50/p95, число запросов к базе и пиковую память. '
+        'Данные готовит команда generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=DEFAULT_ITERATIONS
+        )
+        parser.add_argument(
+            '--user', help='Email пользователя, от имени которого '
+                           'идут запросы. По умолчанию - самый активный.',
+        )
+        parser.add_argument('--save', help='Сохранить результат в JSON.')
+        parser.add_argument(
+            '--compare', help='Сравнить с сохранённым JSON и упасть '
+                              'при регрессии.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+            help='Допустимый рост времени и памяти, доля от базовой линии.',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client = Client(
+            raise_request_exception=False,
+            SERVER_NAME=SERVER_NAME,
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+        results = {}
+        for name, url in self.get_endpoints(user):
+            results[name] = self.measure(url, options['iterations'])
+            self.stdout.write(self.format_result(name, results[name]))
+
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результат сохранён в {options["save"]}')
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    @staticmethod
+    def get_user(email):
+        if email:
+            user = User.objects.filter(email=email).first()
+        else:
+            user = User.objects.filter(
+                shoppingcart__isnull=False, follower__isnull=False
+            ).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Нет подходящего пользователя, запустите generate_data'
+            )
+        return user
+
+    @staticmethod
+    def get_endpoints(user):
+        tag = Tag.objects.order_by('id').first()
+        author_id = user.follower.values_list('author_id', flat=True).first()
+        filters = {
+            'tags': f'tags={tag.slug}' if tag else 'tags=',
+            'author': f'author={author_id}',
+            'is_favorited': 'is_favorited=1',
+            'is_in_shopping_cart': 'is_in_shopping_cart=1',
+        }
+        endpoints = [('recipes', '/api/recipes/')]
+        for size in range(1, len(filters) + 1):
+            for names in combinations(filters, size):
+                query = '&'.join(filters[name] for name in names)
+                endpoints.append(
+                    (f'recipes?{"+".join(names)}', f'/api/recipes/?{query}')
+                )
+        ingredient = Ingredient.objects.order_by('id').first()
+        if ingredient is not None:
+            endpoints.append((
+                'ingredients?name',
+                f'/api/ingredients/?name={ingredient.name[:3]}',
+            ))
+        endpoints.append(('subscriptions', '/api/users/subscriptions/'))
+        for file_format in ('pdf', 'txt', 'csv'):
+            endpoints.append((
+                f'download_shopping_cart?type={file_format}',
+                f'/api/recipes/download_shopping_cart/?type={file_format}',
+            ))
+        return endpoints
+
+    def request(self, url):
+        response = self.client.get(url)
+        consume(response)
+        return response
+
+    def measure(self, url, iterations):
+        response = self.request(url)
+        with CaptureQueriesContext(connection) as context:
+            self.request(url)
+        queries = len(context.captured_queries)
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.request(url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        try:
+            self.request(url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': queries,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    @staticmethod
+    def format_result(name, result):
+        return (
+            f'{name:<60} {result["status"]:>3} '
+            f'p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'{result["queries"]:>3} запр.  '
+            f'{result["peak_kb"]:>8.1f} КБ'
+        )
+
+    def compare(self, results, path, tolerance):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, expected in baseline.items():
+            actual = results.get(name)
+            if actual is None:
+                continue
+            if actual['status'] != expected['status']:
+                regressions.append(
+                    f'{name}: статус {expected["status"]} -> '
+                    f'{actual["status"]}'
+                )
+            for metric in METRICS:
+                limit = expected[metric]
+                if metric not in STRICT_METRICS:
+                    limit *= 1 + tolerance
+                if actual[metric] > limit:
+                    regressions.append(
+                        f'{name}: {metric} {expected[metric]} -> '
+                        f'{actual[metric]}'
+                    )
+        if regressions:
+            raise CommandError(
+                'Регрессия относительно базовой линии:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
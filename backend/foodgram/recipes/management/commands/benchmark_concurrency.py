@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands.benchmark import Command as Benchmark
+from recipes.management.commands.benchmark import percentile
+from recipes.models import Ingredient, Recipe
+
+DEFAULT_URL = 'http://127.0.0.1:8000'
+DEFAULT_CONCURRENCY = 32
+DEFAULT_DURATION = 20
+TIMEOUT = 60
+# Доли эндпоинтов в смешанной нагрузке.
+WEIGHTS = {
+    'recipes': 50,
+    'recipe': 20,
+    'ingredients?name': 15,
+    'tags': 10,
+    'download_shopping_cart?type=pdf': 5,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка на запущенный сервер: N клиентов параллельно '
+        'ходят в ленту, рецепты, поиск ингредиентов, теги и PDF списка '
+        'покупок. Печатает RPS и p50/p95 по эндпоинтам, чтобы сравнить '
+        'WSGI и ASGI на одних данных (см. README).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=DEFAULT_URL)
+        parser.add_argument(
+            '--concurrency', type=int, default=DEFAULT_CONCURRENCY
+        )
+        parser.add_argument(
+            '--duration', type=float, default=DEFAULT_DURATION,
+            help='Длительность в секундах.',
+        )
+        parser.add_argument('--user', help='Email пользователя.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        user = Benchmark.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        self.headers = {'Authorization': f'Token {token.key}'}
+        self.base_url = options['url'].rstrip('/')
+        self.urls = self.get_urls()
+        self.random = random.Random(options['seed'])
+        self.random_lock = threading.Lock()
+        self.results = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.deadline = time.monotonic() + options['duration']
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for _ in range(options['concurrency']):
+                executor.submit(self.client)
+        elapsed = time.monotonic() - started
+        if not self.results:
+            raise CommandError(f'Сервер {self.base_url} не ответил')
+        self.report(elapsed, options['concurrency'])
+
+    def get_urls(self):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:100])
+        ingredient = Ingredient.objects.order_by('id').first()
+        if not recipe_ids or ingredient is None:
+            raise CommandError('Нет данных, запустите generate_data')
+        return {
+            'recipes': lambda pick: '/api/recipes/?limit=20',
+            'recipe': lambda pick: f'/api/recipes/{pick(recipe_ids)}/',
+            'ingredients?name': (
+                lambda pick: f'/api/ingredients/?name={ingredient.name[:3]}'
+            ),
+            'tags': lambda pick: '/api/tags/',
+            'download_shopping_cart?type=pdf': lambda pick: (
+                '/api/recipes/download_shopping_cart/?type=pdf'
+            ),
+        }
+
+    def pick(self, values):
+        with self.random_lock:
+            return self.random.choice(values)
+
+    def next_request(self):
+        with self.random_lock:
+            name = self.random.choices(
+                list(WEIGHTS), weights=list(WEIGHTS.values())
+            )[0]
+        return name, self.base_url + self.urls[name](self.pick)
+
+    def client(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        while time.monotonic() < self.deadline:
+            name, url = self.next_request()
+            started = time.perf_counter()
+            try:
+                response = session.get(url, timeout=TIMEOUT)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            duration = (time.perf_counter() - started) * 1000
+            if ok:
+                self.results[name].append(duration)
+            else:
+                self.errors[name] += 1
+
+    def report(self, elapsed, concurrency):
+        total = sum(len(timings) for timings in self.results.values())
+        for name in WEIGHTS:
+            timings = self.results.get(name) or [0]
+            self.stdout.write(
+                f'{name:<34} {len(self.results.get(name, [])):>6} запр.  '
+                f'p50 {percentile(timings, 50):>8.1f} мс  '
+                f'p95 {percentile(timings, 95):>8.1f} мс  '
+                f'ошибок {self.errors.get(name, 0)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{concurrency} клиентов, {elapsed:.1f} с: '
+            f'{total / elapsed:.1f} запр./с, '
+            f'ошибок {sum(self.errors.values())}'
+        ))
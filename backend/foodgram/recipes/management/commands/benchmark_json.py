@@ -0,0 +1,66 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from foodgram.renderers import FastJSONRenderer, orjson
+from recipes.models import Recipe
+from recipes.serializers import RecipeReadSerializer
+
+DEFAULT_LIMIT = 100
+DEFAULT_ITERATIONS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает JSONRenderer DRF и FastJSONRenderer на странице '
+        'рецептов: проверяет, что вывод совпадает байт в байт, и '
+        'считает пропускную способность. Данные готовит generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+        parser.add_argument(
+            '--iterations', type=int, default=DEFAULT_ITERATIONS
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(
+                'orjson не установлен, FastJSONRenderer использует json'
+            )
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = AnonymousUser()
+        recipes = Recipe.objects.with_related()[:options['limit']]
+        data = {
+            'count': len(recipes),
+            'results': RecipeReadSerializer(
+                recipes, many=True, context={'request': request}
+            ).data,
+        }
+        baseline = self.measure(JSONRenderer(), data, options['iterations'])
+        fast = self.measure(FastJSONRenderer(), data, options['iterations'])
+        if baseline['output'] != fast['output']:
+            raise CommandError('Вывод рендереров различается')
+        size = len(fast['output'])
+        for name, result in (('JSONRenderer', baseline),
+                             ('FastJSONRenderer', fast)):
+            self.stdout.write(
+                f'{name:<18} {result["ms"]:>8.3f} мс  '
+                f'{size * 1000 / result["ms"] / 1024 / 1024:>8.1f} МБ/с'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(recipes)} рецептов, {size} байт, ускорение '
+            f'{baseline["ms"] / fast["ms"]:.1f}x'
+        ))
+
+    @staticmethod
+    def measure(renderer, data, iterations):
+        output = renderer.render(data)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            renderer.render(data)
+        elapsed = (time.perf_counter() - started) * 1000
+        return {'output': output, 'ms': elapsed / iterations}
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import needs_variants, process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные WebP-копии картинок рецептов, у которых их '
+        'ещё нет, например для рецептов, загруженных до их появления.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересобрать копии у всех рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        built = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        ).order_by('id')
+        for recipe in recipes.iterator():
+            if not options['all'] and not needs_variants(recipe):
+                continue
+            try:
+                process_recipe_image(recipe.pk, recipe.image.name)
+            except OSError as error:
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                continue
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {built}'
+        ))
@@ -0,0 +1,119 @@
+import os
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredient, Tag
+from recipes.transfer import (FORMAT_VERSION, append_block, dump_line,
+                              read_checkpoint, remove_checkpoint,
+                              write_checkpoint)
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 500
+RECIPE_FIELDS = (
+    'id', 'author_id', 'name', 'text', 'cooking_time', 'image', 'create_at'
+)
+USER_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с ингредиентами, тегами и авторами в NDJSON '
+        '(с --gzip или для файла .gz - сжатый). Прерванную выгрузку '
+        'можно продолжить с --resume. Файлы картинок не выгружаются, '
+        'только их пути.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с последней записанной пачки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.compress = options['gzip'] or path.endswith('.gz')
+        self.checkpoint = f'{path}.progress'
+        state = read_checkpoint(self.checkpoint) if options['resume'] else None
+        if state is None:
+            open(path, 'wb').close()
+            state = {'last_id': 0, 'offset': 0}
+            state['offset'] = append_block(path, self.header(), self.compress)
+            write_checkpoint(self.checkpoint, state)
+        else:
+            # Всё, что записано после контрольной точки, - обрывок пачки.
+            os.truncate(path, state['offset'])
+            self.stdout.write(f'Продолжаем после рецепта {state["last_id"]}')
+
+        recipes = Recipe.objects.filter(
+            pk__gt=state['last_id']
+        ).order_by('pk').values(*RECIPE_FIELDS).iterator(
+            chunk_size=options['batch_size']
+        )
+        exported = 0
+        seen_authors = set()
+        while True:
+            batch = list(islice(recipes, options['batch_size']))
+            if not batch:
+                break
+            lines = self.batch_lines(batch, seen_authors)
+            state = {
+                'last_id': batch[-1]['id'],
+                'offset': append_block(path, lines, self.compress),
+            }
+            write_checkpoint(self.checkpoint, state)
+            exported += len(batch)
+        remove_checkpoint(self.checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {exported}'
+        ))
+
+    @staticmethod
+    def header():
+        lines = [dump_line({'type': 'meta', 'version': FORMAT_VERSION})]
+        for tag in Tag.objects.order_by('pk').values('name', 'color', 'slug'):
+            lines.append(dump_line({'type': 'tag', **tag}))
+        return lines
+
+    def batch_lines(self, batch, seen_authors):
+        ids = [recipe['id'] for recipe in batch]
+        ingredients = defaultdict(list)
+        rows = RecipeIngredient.objects.filter(recipe_id__in=ids).values_list(
+            'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+            'amount',
+        )
+        for recipe_id, name, unit, amount in rows:
+            ingredients[recipe_id].append([name, unit, amount])
+        tags = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).values_list('recipe_id', 'tag__slug')
+        for recipe_id, slug in rows:
+            tags[recipe_id].append(slug)
+
+        authors = {recipe['author_id'] for recipe in batch} - seen_authors
+        seen_authors.update(authors)
+        lines = [
+            dump_line({'type': 'user', **user})
+            for user in User.objects.filter(pk__in=authors).values(
+                *USER_FIELDS)
+        ]
+        for recipe in batch:
+            if recipe['create_at'] is not None:
+                # DjangoJSONEncoder отбрасывает микросекунды.
+                recipe['create_at'] = recipe['create_at'].isoformat()
+            lines.append(dump_line({
+                'type': 'recipe',
+                **recipe,
+                'tags': tags[recipe['id']],
+                'ingredients': ingredients[recipe['id']],
+            }))
+        return lines
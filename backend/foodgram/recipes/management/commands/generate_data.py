@@ -0,0 +1,199 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes import relations
+from recipes.cook_index import CookIndex
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.reference import ingredients_document, tags_document
+from recipes.search import update_search_index
+from users.models import Follow
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PASSWORD = 'benchmark-password'
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+SYNTHETIC_INGREDIENTS = 500
+UNITS = ('г', 'кг', 'мл', 'л', 'шт', 'ст. л.', 'ч. л.')
+IMAGE = 'recipes/images/benchmark.png'
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует пользователей, рецепты, подписки, избранное и корзины '
+        'для нагрузочного тестирования. Одинаковый --seed даёт одинаковые '
+        'данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes', type=int, default=10,
+            help='Рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Ингредиентов в рецепте.',
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у пользователя.',
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Рецептов в корзине у пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс логинов, чтобы разные прогоны не пересекались.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = f'{options["prefix"]}{options["seed"]}'
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix}_ уже есть, '
+                'укажите другой --prefix или --seed'
+            )
+
+        started = time.monotonic()
+        with transaction.atomic():
+            tags = self.get_tags()
+            ingredients = self.get_ingredients()
+            users = self.create_users(prefix, options['users'])
+            recipes = self.create_recipes(users, options['recipes'])
+            self.create_recipe_relations(
+                recipes, tags, ingredients, options['ingredients']
+            )
+            self.create_follows(users, options['follows'])
+            self.create_user_recipes(Favorite, users, recipes,
+                                     options['favorites'])
+            self.create_user_recipes(ShoppingCart, users, recipes,
+                                     options['cart'])
+        # bulk_create не отправляет сигналов, счётчики, рейтинги и
+        # поисковые документы пересчитываются.
+        call_command('recount', verbosity=0)
+        call_command('update_popularity', all=True, verbosity=0)
+        update_search_index()
+        CookIndex.invalidate()
+        relations.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {len(users)} пользователей и {len(recipes)} рецептов '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            self.bulk_create(Tag, [
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            ])
+            tags_document.invalidate_on_commit()
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def get_ingredients(self):
+        if not Ingredient.objects.exists():
+            self.bulk_create(Ingredient, [
+                Ingredient(
+                    name=f'ингредиент {number}',
+                    measurement_unit=self.rng.choice(UNITS),
+                )
+                for number in range(SYNTHETIC_INGREDIENTS)
+            ])
+            IngredientIndex.invalidate()
+            ingredients_document.invalidate_on_commit()
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, prefix, count):
+        password = make_password(DEFAULT_PASSWORD)
+        self.bulk_create(User, [
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name=f'Имя {number}',
+                last_name=f'Фамилия {number}',
+                password=password,
+            )
+            for number in range(count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, users, per_user):
+        self.bulk_create(Recipe, [
+            Recipe(
+                author_id=user_id,
+                name=f'Рецепт {user_id}-{number}',
+                text='Сгенерированный рецепт для нагрузочного теста.',
+                cooking_time=self.rng.randint(1, 180),
+                image=IMAGE,
+            )
+            for user_id in users for number in range(per_user)
+        ])
+        return list(Recipe.objects.filter(
+            author_id__in=users
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipe_relations(self, recipes, tags, ingredients, count):
+        recipe_tags = []
+        recipe_ingredients = []
+        count = min(count, len(ingredients))
+        for recipe_id in recipes:
+            for tag_id in self.rng.sample(
+                    tags, self.rng.randint(1, len(tags))):
+                recipe_tags.append(Recipe.tags.through(
+                    recipe_id=recipe_id, tag_id=tag_id
+                ))
+            for ingredient_id in self.rng.sample(ingredients, count):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                ))
+        self.bulk_create(Recipe.tags.through, recipe_tags)
+        self.bulk_create(RecipeIngredient, recipe_ingredients)
+
+    def create_follows(self, users, count):
+        follows = []
+        for user_id in users:
+            authors = self.rng.sample(users, min(count + 1, len(users)))
+            authors = [author for author in authors if author != user_id]
+            for author_id in authors[:count]:
+                follows.append(Follow(user_id=user_id, author_id=author_id))
+        self.bulk_create(Follow, follows)
+
+    def create_user_recipes(self, model, users, recipes, count):
+        count = min(count, len(recipes))
+        self.bulk_create(model, [
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in users
+            for recipe_id in self.rng.sample(recipes, count)
+        ])
@@ -0,0 +1,254 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes import response_cache
+from recipes.cook_index import CookIndex
+from recipes.counters import count_subquery
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.reference import ingredients_document
+from recipes.search import update_search_index
+from recipes.transfer import (FORMAT_VERSION, assign_inserted_pks, open_lines,
+                              read_checkpoint, remove_checkpoint,
+                              write_checkpoint)
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из файла export_recipes. id пересчитываются, '
+        'авторы ищутся по почте, теги по слагу, ингредиенты по названию; '
+        'недостающие создаются. Если логин нового автора занят '
+        'пользователем с другой почтой, загрузка останавливается. Рецепт, '
+        'который уже есть у автора с тем же названием и датой, '
+        'пропускается, поэтому повторный запуск и --resume не создают '
+        'дублей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Пропустить строки, загруженные прошлым запуском.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.batch_size = options['batch_size']
+        self.checkpoint = f'{path}.import-progress'
+        state = read_checkpoint(self.checkpoint) if options['resume'] else None
+        skip = state['lines'] if state else 0
+        self.users = {}
+        self.ingredients = {}
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.pending_users = []
+        self.pending_recipes = []
+        self.imported = 0
+        self.skipped = 0
+        self.ingredients_created = False
+
+        line_number = 0
+        with open_lines(path) as file:
+            for line_number, line in enumerate(file, start=1):
+                record = json.loads(line)
+                # Уже загруженные рецепты пропускаются, но авторы и теги
+                # нужны для сопоставления id в следующих пачках.
+                if line_number <= skip and record['type'] == 'recipe':
+                    continue
+                self.handle_record(record)
+                if len(self.pending_recipes) >= self.batch_size:
+                    self.flush(line_number)
+        self.flush(line_number)
+        remove_checkpoint(self.checkpoint)
+        self.finish()
+
+    def handle_record(self, record):
+        kind = record.pop('type')
+        if kind == 'meta':
+            if record.get('version') != FORMAT_VERSION:
+                raise CommandError(
+                    f'Неизвестная версия формата: {record.get("version")}'
+                )
+        elif kind == 'tag':
+            self.save_tag(record)
+        elif kind == 'user':
+            self.pending_users.append(record)
+        elif kind == 'recipe':
+            self.pending_recipes.append(record)
+        else:
+            raise CommandError(f'Неизвестный тип записи: {kind}')
+
+    def save_tag(self, record):
+        if record['slug'] not in self.tags:
+            tag = Tag.objects.create(**record)
+            self.tags[tag.slug] = tag.id
+
+    def flush(self, line_number):
+        with transaction.atomic():
+            self.save_users()
+            recipes = self.save_recipes()
+        self.pending_users = []
+        self.pending_recipes = []
+        if recipes:
+            ids = [recipe.pk for recipe in recipes]
+            update_search_index(ids)
+            User.objects.filter(
+                pk__in={recipe.author_id for recipe in recipes}
+            ).update(recipes_count=count_subquery(Recipe, 'author'))
+        write_checkpoint(self.checkpoint, {'lines': line_number})
+
+    def save_users(self):
+        if not self.pending_users:
+            return
+        emails = {user['email']: user for user in self.pending_users}
+        existing = dict(User.objects.filter(
+            email__in=emails
+        ).values_list('email', 'id'))
+        new = {
+            email: user for email, user in emails.items()
+            if email not in existing
+        }
+        self.check_usernames(new)
+        User.objects.bulk_create([
+            User(
+                email=email,
+                username=user['username'],
+                first_name=user['first_name'],
+                last_name=user['last_name'],
+                password='!',
+            )
+            for email, user in new.items()
+        ], ignore_conflicts=True)
+        existing = dict(User.objects.filter(
+            email__in=emails
+        ).values_list('email', 'id'))
+        missing = sorted(set(emails) - set(existing))
+        if missing:
+            raise CommandError(
+                'Не удалось создать авторов: ' + ', '.join(missing)
+            )
+        for email, user in emails.items():
+            self.users[user['id']] = existing[email]
+
+    @staticmethod
+    def check_usernames(new):
+        """
+        Логин нового автора может быть занят пользователем с другой
+        почтой: bulk_create молча пропустит такого автора вместе со
+        всеми его рецептами, поэтому загрузка останавливается.
+        """
+        taken = dict(User.objects.filter(
+            username__in=[user['username'] for user in new.values()]
+        ).values_list('username', 'email'))
+        conflicts = [
+            f'{user["username"]} ({email}, занят {taken[user["username"]]})'
+            for email, user in new.items() if user['username'] in taken
+        ]
+        if conflicts:
+            raise CommandError(
+                'Логины авторов заняты пользователями с другой почтой: '
+                + ', '.join(conflicts)
+                + '. Переименуйте их и продолжите с --resume.'
+            )
+
+    def resolve_ingredients(self, recipes):
+        units = {
+            name: unit
+            for recipe in recipes for name, unit, _ in recipe['ingredients']
+            if name not in self.ingredients
+        }
+        if not units:
+            return
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in units.items()
+        ], ignore_conflicts=True)
+        found = Ingredient.objects.filter(
+            name__in=units
+        ).values_list('name', 'id')
+        self.ingredients.update(found)
+        self.ingredients_created = True
+
+    def new_recipes(self):
+        """Записи рецептов, у которых есть автор и которых ещё нет."""
+        records = []
+        for record in self.pending_recipes:
+            record['author_id'] = self.users.get(record['author_id'])
+            record['create_at'] = parse_datetime(record['create_at'] or '')
+            if record['author_id'] is None:
+                self.skipped += 1
+                continue
+            records.append(record)
+        existing = set(Recipe.objects.filter(
+            author_id__in={record['author_id'] for record in records},
+            name__in={record['name'] for record in records},
+        ).values_list('author_id', 'name', 'create_at'))
+        result = []
+        for record in records:
+            key = (record['author_id'], record['name'], record['create_at'])
+            if key in existing:
+                self.skipped += 1
+            else:
+                result.append(record)
+        return result
+
+    def save_recipes(self):
+        records = self.new_recipes()
+        if not records:
+            return []
+        self.resolve_ingredients(records)
+        recipes = [
+            Recipe(
+                author_id=record['author_id'],
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image'],
+            )
+            for record in records
+        ]
+        Recipe.objects.bulk_create(recipes)
+        assign_inserted_pks(Recipe, recipes)
+        # auto_now_add перетирает дату при вставке, возвращаем исходную.
+        for recipe, record in zip(recipes, records):
+            recipe.create_at = record['create_at']
+        Recipe.objects.bulk_update(recipes, ['create_at'])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=self.ingredients[name],
+                amount=amount,
+            )
+            for recipe, record in zip(recipes, records)
+            for name, _, amount in record['ingredients']
+            if name in self.ingredients
+        ], ignore_conflicts=True)
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=self.tags[slug])
+            for recipe, record in zip(recipes, records)
+            for slug in record['tags'] if slug in self.tags
+        ], ignore_conflicts=True)
+        self.imported += len(recipes)
+        return recipes
+
+    def finish(self):
+        # bulk-вставки не отправляют сигналов: сбрасываем индексы и кэши.
+        CookIndex.invalidate()
+        if self.ingredients_created:
+            IngredientIndex.invalidate()
+            ingredients_document.invalidate()
+        response_cache.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {self.imported}, '
+            f'пропущено: {self.skipped}'
+        ))
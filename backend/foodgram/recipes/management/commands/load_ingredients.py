@@ -0,0 +1,176 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+from recipes.reference import ingredients_document
+
+# Каталог лежит в data/ в корне репозитория; в контейнере web
+# docker-compose монтирует его в /data, то есть по тому же пути.
+DEFAULT_PATH = os.path.normpath(os.path.join(
+    settings.BASE_DIR, '..', '..', 'data', 'ingredients.json'
+))
+DEFAULT_BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+CSV_HEADER = ['name', 'measurement_unit']
+SEPARATORS = ' \t\r\n,'
+
+
+def _skip_separators(buffer, position):
+    while position < len(buffer) and buffer[position] in SEPARATORS:
+        position += 1
+    return position
+
+
+def _read_array_start(file):
+    buffer = ''
+    while not buffer.strip():
+        chunk = file.read(READ_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+    buffer = buffer.lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов')
+    return buffer[1:]
+
+
+def iter_json(file):
+    """
+    Разбирает JSON-массив по одному объекту, не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = _read_array_start(file)
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        position = _skip_separators(buffer, 0)
+        while position < len(buffer) and buffer[position] != ']':
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+            position = _skip_separators(buffer, position)
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        buffer = buffer[position:]
+        if not chunk:
+            raise CommandError('Файл JSON оборван')
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if not row or row == CSV_HEADER:
+            continue
+        yield {'name': row[0], 'measurement_unit': row[1]}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из JSON или CSV пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Количество строк в одной вставке.',
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='PostgreSQL: COPY во временную таблицу и слияние.',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только для PostgreSQL')
+        parse = iter_csv if path.endswith('.csv') else iter_json
+
+        started = time.monotonic()
+        try:
+            file = open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(
+                f'Не удалось открыть {path}: {error.strerror}'
+            )
+        with file:
+            rows = parse(file)
+            if options['copy']:
+                total, created = self.copy_rows(rows, batch_size)
+            else:
+                total, created = self.bulk_create_rows(rows, batch_size)
+        # bulk_create и COPY не отправляют сигналов post_save.
+        IngredientIndex.invalidate()
+        ingredients_document.invalidate()
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {total}, добавлено {created} ингредиентов '
+            f'за {elapsed:.2f} с ({total / elapsed:.0f} строк/с)'
+        ))
+
+    def bulk_create_rows(self, rows, batch_size):
+        total = 0
+        before = Ingredient.objects.count()
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(**row) for row in batch],
+                ignore_conflicts=True,
+            )
+            total += len(batch)
+            self.report(total)
+        return total, Ingredient.objects.count() - before
+
+    def copy_rows(self, rows, batch_size):
+        table = Ingredient._meta.db_table
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name varchar(150), measurement_unit varchar(10)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batches(rows, batch_size):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(
+                    (row['name'], row['measurement_unit']) for row in batch
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH CSV', buffer
+                )
+                total += len(batch)
+                self.report(total)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_staging '
+                'ON CONFLICT (name) DO NOTHING'
+            )
+            created = cursor.rowcount
+        return total, created
+
+    def report(self, total):
+        if self.verbosity > 1:
+            self.stdout.write(f'Обработано {total} строк')
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, списков покупок и рецептов '
+        'автора, исправляя расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = recount(Recipe.objects.all(), {
+            'favorites_count': (Favorite, 'recipe'),
+            'in_carts_count': (ShoppingCart, 'recipe'),
+        }, batch_size)
+        users = recount(User.objects.all(), {
+            'recipes_count': (Recipe, 'author'),
+        }, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'
+        ))
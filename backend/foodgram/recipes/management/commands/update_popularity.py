@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import response_cache
+from recipes.models import Recipe
+from recipes.popularity import score_recipes
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинги popular и trending у рецептов, '
+        'помеченных сигналами избранного и списка покупок. '
+        'Запускается периодически, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все рецепты, а не только изменившиеся.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.order_by('pk')
+        if not options['all']:
+            recipes = recipes.filter(score_dirty=True)
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(recipes.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                # Флаг снимается до чтения событий: то, что придёт
+                # во время пересчёта, снова пометит рецепт.
+                Recipe.objects.filter(pk__in=pks).update(score_dirty=False)
+                score_recipes(pks)
+            updated += len(pks)
+            last_pk = pks[-1]
+        if updated:
+            response_cache.invalidate_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рейтингов: {updated}'
+        ))
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+TRIGRAM_INDEX = 'ingredient_name_trgm_idx'
+
+
+def remove_duplicate_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        keep=Min('id'), count=Count('id')
+    ).filter(count__gt=1).order_by()
+    for row in duplicates.iterator():
+        RecipeIngredient.objects.filter(
+            recipe=row['recipe'], ingredient=row['ingredient']
+        ).exclude(id=row['keep']).delete()
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Django строит icontains/istartswith как UPPER(name::text) LIKE ...
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+        'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-create_at', '-id'], name='recipe_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-create_at'], name='recipe_author_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:40
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def mark_active_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(
+        Q(favorites_count__gt=0) | Q(in_carts_count__gt=0)
+    ).update(score_dirty=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_dirty',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Нужно пересчитать популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность за неделю'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity_score', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(mark_active_recipes, migrations.RunPython.noop),
+    ]
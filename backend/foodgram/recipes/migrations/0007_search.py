@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# SQL скопирован из recipes.search на момент миграции: исторические
+# миграции не импортируют код приложения, который может измениться.
+# Колонки search_vector и таблицы FTS нет в состоянии моделей Django,
+# ими управляют только эта миграция и recipes.search.
+SEARCH_INDEX = 'recipe_search_idx'
+FTS_TABLE = 'recipes_recipe_fts'
+
+POSTGRES_CREATE = (
+    'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+    'tsvector',
+    f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} '
+    'ON recipes_recipe USING gin (search_vector)',
+    """
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector('russian', recipe.name), 'A')
+        || setweight(to_tsvector('russian', recipe.text), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS item
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = item.ingredient_id
+            WHERE item.recipe_id = recipe.id
+        ), '')), 'C')
+    """,
+)
+POSTGRES_DROP = (
+    f'DROP INDEX IF EXISTS {SEARCH_INDEX}',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+    'USING fts5(name, text, ingredients)',
+    f'DELETE FROM {FTS_TABLE}',
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)
+    SELECT recipe.id, recipe.name, recipe.text, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS item
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), '')
+    FROM recipes_recipe AS recipe
+    """,
+)
+SQLITE_DROP = (f'DROP TABLE IF EXISTS {FTS_TABLE}',)
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_CREATE, POSTGRES_DROP),
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+}
+
+
+def _execute(schema_editor, direction):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for sql in statements[direction]:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, 0)
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_popularity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
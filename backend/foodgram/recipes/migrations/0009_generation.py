@@ -0,0 +1,24 @@
+# Generated by Django 3.2.5 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Ключ')),
+                ('value', models.BigIntegerField(verbose_name='Поколение')),
+            ],
+            options={
+                'verbose_name': 'Поколение кэша',
+                'verbose_name_plural': 'Поколения кэша',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.5 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CookIndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(null=True, verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса подбора',
+                'verbose_name_plural': 'Изменения индекса подбора',
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import OuterRef, Prefetch, Subquery
 
 User = get_user_model()
 
@@ -47,7 +48,49 @@ class Tag(models.Model):
         return self.slug
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Подгружает автора, теги и ингредиенты, чтобы сериализатор
+        не ходил в базу по строкам. Флаги пользователя берутся из
+        recipes.relations.
+        """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('recipe', 'id'),
+            ),
+        )
+
+    def latest_per_author(self, limit=None):
+        """
+        Последние limit рецептов каждого автора одним запросом
+        (коррелированный подзапрос с LIMIT), для Prefetch по авторам.
+        """
+        queryset = self.order_by('-create_at', '-id')
+        if limit is None:
+            return queryset
+        latest = Recipe.objects.filter(
+            author=OuterRef('author')
+        ).order_by('-create_at', '-id').values('pk')[:limit]
+        return queryset.filter(pk__in=Subquery(latest))
+
+
 class Recipe(models.Model):
+    # Поисковый документ (колонка search_vector в PostgreSQL, таблица
+    # FTS5 в SQLite) не описан полем: его создаёт миграция 0007_search,
+    # а читает и пишет recipes.search сырым SQL.
+
+    # Пишутся только через update() с F() и фоновой обработкой картинок,
+    # поэтому save() существующего рецепта их не трогает.
+    DERIVED_FIELDS = (
+        'image_variants', 'favorites_count', 'in_carts_count',
+        'popularity_score', 'trending_score', 'score_dirty',
+    )
+
     ingredients = models.ManyToManyField(
         Ingredient, through='RecipeIngredient', verbose_name='Ингредиенты'
     )
@@ -59,6 +102,10 @@ class Recipe(models.Model):
         verbose_name='Автор',
     )
     image = models.ImageField(verbose_name='Картинка')
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name='Уменьшенные копии картинки',
+    )
     name = models.CharField(max_length=256, verbose_name='Название')
     text = models.CharField(max_length=256, verbose_name='Описание')
     cooking_time = models.PositiveSmallIntegerField(
@@ -70,15 +117,61 @@ class Recipe(models.Model):
     create_at = models.DateTimeField(
         auto_now_add=True, verbose_name='Создан', null=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок'
+    )
+    popularity_score = models.FloatField(
+        default=0, editable=False, verbose_name='Популярность'
+    )
+    trending_score = models.FloatField(
+        default=0, editable=False, verbose_name='Популярность за неделю'
+    )
+    score_dirty = models.BooleanField(
+        default=False, editable=False, db_index=True,
+        verbose_name='Нужно пересчитать популярность',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-create_at',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('-create_at', '-id'), name='recipe_feed_idx'
+            ),
+            models.Index(
+                fields=('author', '-create_at'), name='recipe_author_idx'
+            ),
+            models.Index(
+                fields=('-popularity_score', '-id'), name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'), name='recipe_trending_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет существующий рецепт без DERIVED_FIELDS: иначе копия,
+        загруженная в начале запроса, затрёт параллельные F()-обновления
+        счётчиков и только что построенные варианты картинки.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -103,6 +196,12 @@ class RecipeIngredient(models.Model):
         ordering = ('recipe',)
         verbose_name = 'Ингредиенты рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient',
+            )
+        ]
 
     def __str__(self) -> str:
         return f'{self.recipe} {self.ingredient}'
@@ -164,3 +263,37 @@ class ShoppingCart(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} {self.recipe}'
+
+
+class Generation(models.Model):
+    """
+    Счётчик поколения кэша. Лежит в базе, чтобы сброс в одном процессе
+    (воркере, команде manage.py) видели все остальные.
+    """
+    key = models.CharField(
+        max_length=200, primary_key=True, verbose_name='Ключ'
+    )
+    value = models.BigIntegerField(verbose_name='Поколение')
+
+    class Meta:
+        verbose_name = 'Поколение кэша'
+        verbose_name_plural = 'Поколения кэша'
+
+    def __str__(self) -> str:
+        return f'{self.key}={self.value}'
+
+
+class CookIndexChange(models.Model):
+    """
+    Журнал изменений для индекса подбора по ингредиентам
+    (recipes.cook_index): id записи - поколение индекса. Запись без
+    рецепта означает полную перестройку.
+    """
+    recipe_id = models.BigIntegerField(null=True, verbose_name='Рецепт')
+
+    class Meta:
+        verbose_name = 'Изменение индекса подбора'
+        verbose_name_plural = 'Изменения индекса подбора'
+
+    def __str__(self) -> str:
+        return f'{self.pk}: {self.recipe_id}'
@@ -1,5 +1,156 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPaginator(BasePagination):
+    """
+    Keyset-пагинация ленты рецептов по (create_at, id) без COUNT(*).
+    Для ленты без фильтров в PostgreSQL отдаёт оценку count из
+    pg_class.reltuples, иначе count равен null.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    page_size_query_param = 'limit'
+    invalid_cursor_message = 'Неверный курсор'
+
+    @classmethod
+    def is_requested(cls, request):
+        return (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get(cls.mode_query_param) == 'cursor'
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return size if size > 0 else api_settings.PAGE_SIZE
+
+    def encode_cursor(self, recipe):
+        # Страница может состоять из строк values() быстрого пути чтения.
+        if isinstance(recipe, dict):
+            create_at, pk = recipe['create_at'], recipe['id']
+        else:
+            create_at, pk = recipe.create_at, recipe.pk
+        create_at = create_at.isoformat() if create_at else None
+        payload = json.dumps([create_at, pk]).encode()
+        return urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            create_at, pk = json.loads(urlsafe_b64decode(encoded.encode()))
+            if create_at is not None:
+                create_at = parse_datetime(create_at)
+                if create_at is None:
+                    raise ValueError
+            return create_at, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def after(create_at, pk):
+        """
+        Условие для рецептов после позиции курсора в порядке
+        (-create_at, -id). NULL в create_at идут первыми в PostgreSQL
+        и последними в SQLite, как и при сортировке самой базой.
+        """
+        nulls_first = connection.features.nulls_order_largest
+        if create_at is None:
+            condition = Q(create_at__isnull=True, id__lt=pk)
+            if nulls_first:
+                condition |= Q(create_at__isnull=False)
+            return condition
+        condition = (
+            Q(create_at__lt=create_at) | Q(create_at=create_at, id__lt=pk)
+        )
+        if not nulls_first:
+            condition |= Q(create_at__isnull=True)
+        return condition
+
+    @staticmethod
+    def estimate_count(queryset):
+        if queryset.query.where or connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = self.estimate_count(queryset)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-create_at', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(*position))
+        page = list(queryset[:page_size + 1])
+        self.next_recipe = None
+        if len(page) > page_size:
+            self.next_recipe = page[page_size - 1]
+        return page[:page_size]
+
+    def get_next_link(self):
+        if self.next_recipe is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_recipe)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class RecipePaginator(CustomPageNumberPaginator):
+    """
+    Постраничная пагинация для фронтенда; keyset-пагинация при
+    ?pagination=cursor или ?cursor=. Курсор построен по дате, поэтому
+    при сортировке по рейтингу (?ordering=) и при поиске (?search=)
+    остаётся постраничная.
+    """
+    ordering_query_params = ('ordering', 'search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        custom_order = any(
+            param in request.query_params
+            for param in self.ordering_query_params
+        )
+        if RecipeCursorPaginator.is_requested(request) and not custom_order:
+            self.cursor_paginator = RecipeCursorPaginator()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,299 @@
+import binascii
+import io
+import json
+import re
+import uuid
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from foodgram.parsers import loads
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+
+CHUNK_SIZE = 64 * 1024
+# Картинка до этого размера держится в памяти, больше - уходит на диск.
+SPOOL_SIZE = 1024 * 1024
+# Сколько декодированных байт нужно Pillow, чтобы прочитать заголовок.
+HEADER_SIZES = (16 * 1024, 256 * 1024)
+DATA_URI_PREFIX = b'data:'
+MAX_DATA_URI_HEADER = 256
+DEFAULT_LIMITS = {
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'MAX_PIXELS': 40 * 1000 * 1000,
+    'MAX_JSON_BYTES': 1024 * 1024,
+    'FORMATS': ('JPEG', 'PNG', 'GIF', 'WEBP'),
+}
+STRUCTURE = re.compile(rb'["{}\[\]:,]')
+STRING = re.compile(rb'["\\]')
+INVALID_IMAGE = 'Загрузите корректное изображение'
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос'
+    default_code = 'payload_too_large'
+
+
+def get_limits():
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(getattr(settings, 'RECIPE_IMAGE_UPLOAD', {}))
+    return limits
+
+
+class Base64ImageSink:
+    """
+    Декодирует base64 по кускам в SpooledTemporaryFile. Формат и размеры
+    проверяются по заголовку, как только его удаётся прочитать, поэтому
+    слишком большая картинка отклоняется до конца загрузки.
+    """
+
+    def __init__(self, field, limits):
+        self.field = field
+        self.limits = limits
+        self.file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self.size = 0
+        self.header = b''
+        self.header_done = False
+        self.pending = b''
+        self.format = None
+        self.checks = list(HEADER_SIZES)
+
+    def error(self, message):
+        return ValidationError({self.field: [message]})
+
+    def write(self, data):
+        if not self.header_done:
+            data = self._strip_data_uri(data)
+            if data is None:
+                return
+        data = self.pending + data
+        escape = b''
+        if data.endswith(b'\\'):
+            data, escape = data[:-1], b'\\'
+        # В JSON-строке base64 может содержать экранированные / и переносы.
+        data = data.replace(b'\\/', b'/').replace(b'\\n', b'').replace(
+            b'\\r', b'')
+        data = b''.join(data.split())
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:] + escape
+        self._decode(data[:usable])
+
+    def _strip_data_uri(self, data):
+        self.header += data
+        if not self.header.startswith(DATA_URI_PREFIX[:len(self.header)]):
+            self.header_done = True
+            data, self.header = self.header, b''
+            return data
+        comma = self.header.find(b',')
+        if comma < 0:
+            if len(self.header) > MAX_DATA_URI_HEADER:
+                raise self.error(INVALID_IMAGE)
+            return None
+        if not self.header[:comma].endswith(b';base64'):
+            raise self.error(INVALID_IMAGE)
+        self.header_done = True
+        data, self.header = self.header[comma + 1:], b''
+        return data
+
+    def _decode(self, data):
+        if not data:
+            return
+        try:
+            decoded = binascii.a2b_base64(data)
+        except binascii.Error:
+            raise self.error(INVALID_IMAGE)
+        self.size += len(decoded)
+        if self.size > self.limits['MAX_BYTES']:
+            raise PayloadTooLarge(
+                f'Картинка больше {self.limits["MAX_BYTES"]} байт'
+            )
+        self.file.write(decoded)
+        if self.checks and self.size >= self.checks[0]:
+            self.checks.pop(0)
+            self._check_header(final=False)
+
+    def _open_header(self):
+        """Формат и размеры по уже декодированной части или None."""
+        self.file.seek(0)
+        try:
+            image = Image.open(self.file)
+            return image.format, image.size
+        except Image.DecompressionBombError:
+            raise self.error(
+                f'Картинка больше {self.limits["MAX_PIXELS"]} пикселей'
+            )
+        except (OSError, SyntaxError):
+            return None
+        finally:
+            self.file.seek(0, io.SEEK_END)
+
+    def _check_header(self, final):
+        if self.format is not None:
+            return
+        header = self._open_header()
+        if header is None:
+            if final:
+                raise self.error(INVALID_IMAGE)
+            return
+        image_format, (width, height) = header
+        if image_format not in self.limits['FORMATS']:
+            raise self.error(
+                f'Допустимые форматы: {", ".join(self.limits["FORMATS"])}'
+            )
+        if width * height > self.limits['MAX_PIXELS']:
+            raise self.error(
+                f'Картинка больше {self.limits["MAX_PIXELS"]} пикселей'
+            )
+        self.format = image_format
+
+    def close(self):
+        if not self.header_done:
+            if self.header.startswith(DATA_URI_PREFIX):
+                raise self.error(INVALID_IMAGE)
+            self.header_done = True
+            self.write(self.header)
+        tail = self.pending.rstrip(b'\\')
+        self._decode(tail + b'=' * (-len(tail) % 4))
+        if not self.size:
+            raise self.error(INVALID_IMAGE)
+        self._check_header(final=True)
+        self.file.seek(0)
+        extension = 'jpg' if self.format == 'JPEG' else self.format.lower()
+        return UploadedFile(
+            file=self.file,
+            name=f'{uuid.uuid4()}.{extension}',
+            content_type=Image.MIME.get(self.format),
+            size=self.size,
+        )
+
+
+class JSONImageScanner:
+    """
+    Потоковый разбор JSON-объекта: всё, кроме строковых значений полей
+    верхнего уровня из fields, копируется в text, а эти значения
+    декодируются из base64 в файлы и заменяются в text метками.
+    """
+
+    def __init__(self, fields, limits):
+        self.fields = {field.encode(): field for field in fields}
+        self.limits = limits
+        self.text = bytearray()
+        self.files = {}
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string = None
+        self.key = None
+        self.sink = None
+
+    def feed(self, chunk):
+        position = 0
+        while position < len(chunk):
+            if self.sink is not None:
+                position = self._feed_sink(chunk, position)
+            elif self.in_string:
+                position = self._feed_string(chunk, position)
+            else:
+                position = self._feed_structure(chunk, position)
+        if len(self.text) > self.limits['MAX_JSON_BYTES']:
+            raise PayloadTooLarge()
+
+    def _feed_sink(self, chunk, position):
+        end = chunk.find(b'"', position)
+        if end < 0:
+            self.sink.write(chunk[position:])
+            return len(chunk)
+        self.sink.write(chunk[position:end])
+        marker = f'__file_{uuid.uuid4().hex}__'
+        self.files[marker] = self.sink.close()
+        self.text += json.dumps(marker).encode()
+        self.sink = None
+        return end + 1
+
+    def _feed_string(self, chunk, position):
+        if self.escape:
+            self.text += chunk[position:position + 1]
+            self.escape = False
+            return position + 1
+        match = STRING.search(chunk, position)
+        if match is None:
+            self.text += chunk[position:]
+            return len(chunk)
+        self.text += chunk[position:match.end()]
+        if match.group() == b'\\':
+            self.escape = True
+            return match.end()
+        self.in_string = False
+        self.last_string = bytes(self.text[self.string_start:-1])
+        return match.end()
+
+    def _feed_structure(self, chunk, position):
+        match = STRUCTURE.search(chunk, position)
+        if match is None:
+            self.text += chunk[position:]
+            return len(chunk)
+        self.text += chunk[position:match.start()]
+        char = match.group()
+        if char == b'"' and self.depth == 1 and self.key in self.fields:
+            self.sink = Base64ImageSink(self.fields[self.key], self.limits)
+            self.key = None
+            return match.end()
+        self.text += char
+        if char == b'"':
+            self.in_string = True
+            self.string_start = len(self.text)
+        elif char in b'{[':
+            self.depth += 1
+        elif char in b'}]':
+            self.depth -= 1
+        elif char == b':' and self.depth == 1:
+            self.key = self.last_string
+        elif char == b',':
+            self.key = None
+        return match.end()
+
+    def result(self):
+        if self.in_string or self.sink is not None:
+            raise ParseError('JSON parse error - unterminated string')
+        try:
+            data = loads(bytes(self.text))
+        except ValueError as error:
+            raise ParseError(f'JSON parse error - {error}')
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if isinstance(value, str) and value in self.files:
+                    data[key] = self.files[value]
+        return data
+
+
+class RecipeJSONParser(JSONParser):
+    """
+    JSON-парсер рецептов, который не держит картинку в памяти целиком:
+    base64 из image декодируется в файл по мере чтения запроса.
+    """
+    stream_fields = ('image',)
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limits = get_limits()
+        request = (parser_context or {}).get('request')
+        if request is not None:
+            self.check_content_length(request, limits)
+        scanner = JSONImageScanner(self.stream_fields, limits)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            scanner.feed(chunk)
+        return scanner.result()
+
+    @staticmethod
+    def check_content_length(request, limits):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return
+        # base64 на треть длиннее исходных байт.
+        allowed = limits['MAX_BYTES'] * 4 // 3 + limits['MAX_JSON_BYTES']
+        if length > allowed:
+            raise PayloadTooLarge()
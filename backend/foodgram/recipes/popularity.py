@@ -0,0 +1,72 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .models import Favorite, Recipe, ShoppingCart
+
+FAVORITE_WEIGHT = 1.0
+CART_WEIGHT = 2.0
+DEFAULT_HALF_LIFE_DAYS = 7
+# Точка отсчёта для затухания. Вклад действия растёт как
+# 2 ** ((t - EPOCH) / half_life): на порядок рецептов общий множитель
+# 2 ** ((EPOCH - now) / half_life) не влияет, поэтому старые оценки
+# не нужно пересчитывать только из-за хода времени.
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+ORDERINGS = {
+    'popular': ('-popularity_score', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+def half_life_seconds():
+    days = getattr(
+        settings, 'RECIPE_TRENDING_HALF_LIFE_DAYS', DEFAULT_HALF_LIFE_DAYS
+    )
+    return days * 24 * 60 * 60
+
+
+def trending_score(events, half_life):
+    """
+    log2 от суммы weight * 2 ** ((t - EPOCH) / half_life) по событиям.
+    Старший показатель выносится за скобки, чтобы сумма не переполнялась.
+    """
+    if not events:
+        return 0.0
+    exponents = [
+        ((created - EPOCH).total_seconds() / half_life, weight)
+        for created, weight in events
+    ]
+    top = max(exponent for exponent, _ in exponents)
+    total = sum(
+        weight * 2 ** (exponent - top) for exponent, weight in exponents
+    )
+    return top + math.log2(total)
+
+
+def score_recipes(recipe_ids):
+    """Пересчитывает оценки популярности указанных рецептов."""
+    half_life = half_life_seconds()
+    events = defaultdict(list)
+    popularity = defaultdict(float)
+    for model, weight in ((Favorite, FAVORITE_WEIGHT),
+                          (ShoppingCart, CART_WEIGHT)):
+        rows = model.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'create_at')
+        for recipe_id, created in rows.iterator():
+            events[recipe_id].append((created, weight))
+            popularity[recipe_id] += weight
+    recipes = [
+        Recipe(
+            pk=recipe_id,
+            popularity_score=popularity[recipe_id],
+            trending_score=trending_score(events[recipe_id], half_life),
+        )
+        for recipe_id in recipe_ids
+    ]
+    Recipe.objects.bulk_update(
+        recipes, ['popularity_score', 'trending_score']
+    )
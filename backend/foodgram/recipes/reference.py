@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from foodgram.renderers import FastJSONRenderer
+
+from .generations import bump_generation, get_generation
+from .models import Ingredient, Tag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MAX_AGE = 0
+CONTENT_TYPE = 'application/json'
+IDENTITY = 'identity'
+# Сжатые варианты строятся вместе с документом, в порядке предпочтения.
+COMPRESSORS = {
+    'br': brotli.compress if brotli else None,
+    'gzip': lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+
+State = namedtuple('State', ('generation', 'digest', 'bodies'))
+
+
+def get_max_age():
+    return getattr(settings, 'REFERENCE_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encodings = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class ReferenceDocument:
+    """
+    Справочник целиком в виде готового JSON в памяти процесса, вместе
+    со сжатыми вариантами. Пересобирается, когда меняется поколение
+    generation_key, поэтому запрос не трогает ни ORM, ни сериализатор.
+    """
+
+    def __init__(self, generation_key, load):
+        self.generation_key = generation_key
+        self.load = load
+        self._state = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        bump_generation(self.generation_key)
+
+    def invalidate_on_commit(self):
+        transaction.on_commit(self.invalidate)
+
+    def build(self, generation):
+        body = FastJSONRenderer().render(self.load())
+        bodies = {IDENTITY: body}
+        for encoding, compress in COMPRESSORS.items():
+            if compress is None:
+                continue
+            compressed = compress(body)
+            if len(compressed) < len(body):
+                bodies[encoding] = compressed
+        digest = hashlib.sha256(body).hexdigest()
+        return State(generation, digest, bodies)
+
+    def get_state(self):
+        generation = get_generation(self.generation_key)
+        state = self._state
+        if state is None or state.generation != generation:
+            with self._lock:
+                state = self._state
+                if state is None or state.generation != generation:
+                    state = self._state = self.build(generation)
+        return state
+
+    def response(self, request):
+        state = self.get_state()
+        accepted = accepted_encodings(request)
+        encoding = next(
+            (name for name in COMPRESSORS
+             if name in accepted and name in state.bodies),
+            IDENTITY,
+        )
+        # Строгий ETag у каждого варианта свой.
+        etag = quote_etag(
+            state.digest if encoding == IDENTITY
+            else f'{state.digest}-{encoding}'
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                state.bodies[encoding], content_type=CONTENT_TYPE
+            )
+            if encoding != IDENTITY:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={get_max_age()}, must-revalidate'
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+tags_document = ReferenceDocument(
+    'reference:tags:generation',
+    lambda: list(Tag.objects.values('id', 'name', 'color', 'slug')),
+)
+ingredients_document = ReferenceDocument(
+    'reference:ingredients:generation',
+    lambda: list(Ingredient.objects.values('id', 'name', 'measurement_unit')),
+)
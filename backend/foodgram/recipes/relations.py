@@ -0,0 +1,134 @@
+from array import array
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, IntegerField, Value
+from users.models import Follow
+
+from .generations import bump_generation, get_generations
+from .models import Favorite, ShoppingCart
+
+GENERATION_KEY = 'relations:generation'
+USER_GENERATION_KEY = 'relations:{user}:generation'
+USER_KEY = 'relations:{generation}:{user}:{user_generation}'
+DEFAULT_TIMEOUT = 3600
+FAVORITES = 'favorites'
+CART = 'cart'
+FOLLOWING = 'following'
+# Вид связи: модель и поле с id рецепта или автора.
+RELATIONS = {
+    FAVORITES: (Favorite, 'recipe_id'),
+    CART: (ShoppingCart, 'recipe_id'),
+    FOLLOWING: (Follow, 'author_id'),
+}
+REQUEST_ATTR = '_user_relations'
+
+
+def get_timeout():
+    return getattr(settings, 'USER_RELATIONS_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+class UserRelations:
+    """
+    Избранное, список покупок и подписки пользователя в виде
+    отсортированных массивов id: компактно в кэше, поиск - бинарный.
+    """
+
+    def __init__(self, ids=None):
+        self.ids = ids or {kind: array('q') for kind in RELATIONS}
+
+    def has(self, kind, pk):
+        ids = self.ids[kind]
+        index = bisect_left(ids, pk)
+        return index < len(ids) and ids[index] == pk
+
+    def update(self, kind, add=(), remove=()):
+        ids = self.ids[kind]
+        for pk in add:
+            if not self.has(kind, pk):
+                insort(ids, pk)
+        for pk in remove:
+            index = bisect_left(ids, pk)
+            if index < len(ids) and ids[index] == pk:
+                del ids[index]
+
+    @classmethod
+    def load(cls, user_id):
+        """Все три вида связей одним запросом."""
+        kinds = list(RELATIONS)
+        queries = [
+            model.objects.filter(user_id=user_id).annotate(
+                kind=Value(number, output_field=IntegerField()),
+                target=F(field),
+            ).order_by().values_list('kind', 'target')
+            for number, (model, field) in enumerate(RELATIONS.values())
+        ]
+        values = {kind: [] for kind in kinds}
+        for number, pk in queries[0].union(*queries[1:], all=True):
+            values[kinds[number]].append(pk)
+        return cls({kind: array('q', sorted(values[kind])) for kind in kinds})
+
+
+ANONYMOUS = UserRelations()
+
+
+def _generations(user_id):
+    return get_generations(
+        GENERATION_KEY, USER_GENERATION_KEY.format(user=user_id)
+    )
+
+
+def _key(user_id, generation, user_generation):
+    return USER_KEY.format(
+        generation=generation, user=user_id, user_generation=user_generation
+    )
+
+
+def user_relations(user_id):
+    key = _key(user_id, *_generations(user_id))
+    relations = cache.get(key)
+    if relations is None:
+        relations = UserRelations.load(user_id)
+        cache.set(key, relations, get_timeout())
+    return relations
+
+
+def get_relations(request):
+    """Связи текущего пользователя, загружаются один раз на запрос."""
+    if request is None or request.user.is_anonymous:
+        return ANONYMOUS
+    relations = getattr(request, REQUEST_ATTR, None)
+    if relations is None:
+        relations = user_relations(request.user.pk)
+        setattr(request, REQUEST_ATTR, relations)
+    return relations
+
+
+def update_relations(user_id, kind, add=(), remove=()):
+    """
+    После коммита сдвигает поколение связей пользователя в базе, чтобы
+    старую запись не читал ни один процесс, и кладёт под новое
+    поколение исправленную копию, не перечитывая связи из базы.
+    Если записи не было или поколение параллельно сдвинула другая
+    правка, запись загрузит следующий запрос.
+    """
+    def apply():
+        generation, user_generation = _generations(user_id)
+        relations = cache.get(_key(user_id, generation, user_generation))
+        bump_generation(USER_GENERATION_KEY.format(user=user_id))
+        if relations is None:
+            return
+        current = _generations(user_id)
+        if current != [generation, user_generation + 1]:
+            return
+        relations.update(kind, add, remove)
+        cache.set(_key(user_id, *current), relations, get_timeout())
+
+    transaction.on_commit(apply)
+
+
+def invalidate_all():
+    """Сбрасывает связи всех пользователей, например после bulk-вставок."""
+    bump_generation(GENERATION_KEY)
@@ -0,0 +1,73 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .generations import bump_generation, get_generations
+
+SHARED_GENERATION_KEY = 'recipes:shared:generation'
+LIST_GENERATION_KEY = 'recipes:list:generation'
+RECIPE_GENERATION_KEY = 'recipes:{pk}:generation'
+LIST_KEY = 'recipes:list:{shared}:{list}:{digest}'
+DETAIL_KEY = 'recipes:detail:{pk}:{shared}:{recipe}'
+# Для анонима остальные фильтры RecipeFilter не меняют выдачу.
+LIST_QUERY_PARAMS = ('page', 'limit', 'tags', 'author', 'search',
+                     'ordering', 'pagination', 'cursor')
+DEFAULT_TIMEOUT = 600
+
+
+def get_timeout():
+    return getattr(settings, 'RECIPE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def list_key(request):
+    """
+    Ключ списка рецептов: поколения и нормализованный query string.
+    Хост входит в ключ, потому что ссылки next/previous абсолютные.
+    """
+    params = sorted(
+        (name, value)
+        for name in LIST_QUERY_PARAMS
+        for value in request.query_params.getlist(name)
+    )
+    query = f'{request.scheme}://{request.get_host()}?{urlencode(params)}'
+    shared, list_generation = get_generations(
+        SHARED_GENERATION_KEY, LIST_GENERATION_KEY
+    )
+    return LIST_KEY.format(
+        shared=shared,
+        list=list_generation,
+        digest=hashlib.sha1(query.encode()).hexdigest(),
+    )
+
+
+def detail_key(pk):
+    shared, recipe = get_generations(
+        SHARED_GENERATION_KEY, RECIPE_GENERATION_KEY.format(pk=pk)
+    )
+    return DETAIL_KEY.format(pk=pk, shared=shared, recipe=recipe)
+
+
+def read(key):
+    return cache.get(key)
+
+
+def store(key, data):
+    cache.set(key, data, get_timeout())
+
+
+def invalidate_recipe(pk):
+    """Сбрасывает списки и карточку одного рецепта."""
+    bump_generation(LIST_GENERATION_KEY)
+    bump_generation(RECIPE_GENERATION_KEY.format(pk=pk))
+
+
+def invalidate_all():
+    """Сбрасывает всё, например при изменении тега или пользователя."""
+    bump_generation(SHARED_GENERATION_KEY)
+
+
+def invalidate_lists():
+    """Сбрасывает только списки, например после пересчёта рейтингов."""
+    bump_generation(LIST_GENERATION_KEY)
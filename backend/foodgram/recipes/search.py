@@ -0,0 +1,134 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+# В PostgreSQL документ хранится в колонке recipes_recipe.search_vector
+# (tsvector с русской конфигурацией и GIN-индексом), в SQLite - в
+# FTS5-таблице recipes_recipe_fts с rowid, равным id рецепта.
+# Обе структуры создаёт миграция 0007_search и обновляют сигналы. В
+# состоянии моделей их нет: makemigrations их не видит, а flush не
+# очищает таблицу FTS, после него индекс пересобирает
+# update_search_index().
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+BATCH_SIZE = 500
+WORD = re.compile(r'\w+')
+
+POSTGRES_UPDATE = """
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector('russian', recipe.name), 'A')
+        || setweight(to_tsvector('russian', recipe.text), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS item
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = item.ingredient_id
+            WHERE item.recipe_id = recipe.id
+        ), '')), 'C')
+"""
+SQLITE_DELETE = f'DELETE FROM {FTS_TABLE}'
+SQLITE_INSERT = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)
+    SELECT recipe.id, recipe.name, recipe.text, coalesce((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS item
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), '')
+    FROM recipes_recipe AS recipe
+"""
+# Название важнее описания, описание важнее ингредиентов.
+SQLITE_RANK = f'bm25({FTS_TABLE}, 10.0, 5.0, 1.0)'
+
+
+def _batches(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        yield recipe_ids[start:start + BATCH_SIZE]
+
+
+def _update_postgresql(cursor, batch):
+    if batch is None:
+        cursor.execute(POSTGRES_UPDATE)
+    else:
+        cursor.execute(POSTGRES_UPDATE + ' WHERE recipe.id = ANY(%s)',
+                       [batch])
+
+
+def _update_sqlite(cursor, batch):
+    if batch is None:
+        cursor.execute(SQLITE_DELETE)
+        cursor.execute(SQLITE_INSERT)
+        return
+    placeholders = ', '.join(['%s'] * len(batch))
+    cursor.execute(
+        f'{SQLITE_DELETE} WHERE rowid IN ({placeholders})', batch
+    )
+    cursor.execute(
+        f'{SQLITE_INSERT} WHERE recipe.id IN ({placeholders})', batch
+    )
+
+
+def update_search_index(recipe_ids=None):
+    """
+    Пересобирает поисковые документы рецептов recipe_ids,
+    при recipe_ids=None - всех рецептов.
+    """
+    if connection.vendor == 'postgresql':
+        update = _update_postgresql
+    elif connection.vendor == 'sqlite':
+        update = _update_sqlite
+    else:
+        return
+    batches = [None] if recipe_ids is None else _batches(recipe_ids)
+    with connection.cursor() as cursor:
+        for batch in batches:
+            update(cursor, batch)
+
+
+def _words(value):
+    return WORD.findall(value.lower())
+
+
+def search_recipes(queryset, value):
+    """
+    Оставляет рецепты, в которых встречаются все слова value (как
+    префиксы), и аннотирует их релевантностью search_rank.
+    """
+    words = _words(value)
+    if not words:
+        return queryset
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{word}:*' for word in words)
+        tsquery = f"to_tsquery('{SEARCH_CONFIG}', %s)"
+        match = RawSQL(
+            f'recipes_recipe.search_vector @@ {tsquery}', [query],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {tsquery})', [query],
+            output_field=FloatField(),
+        )
+    elif vendor == 'sqlite':
+        query = ' '.join(f'"{word}"*' for word in words)
+        match = RawSQL(
+            f'recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)', [query],
+            output_field=BooleanField(),
+        )
+        # bm25 тем меньше, чем документ релевантнее.
+        rank = RawSQL(
+            f'(SELECT -{SQLITE_RANK} FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = recipes_recipe.id)', [query],
+            output_field=FloatField(),
+        )
+    else:
+        return queryset.filter(name__icontains=value)
+    return queryset.filter(match).annotate(
+        search_rank=rank
+    ).order_by('-search_rank', '-id')
@@ -1,9 +1,12 @@
-from drf_extra_fields.fields import Base64ImageField
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from users.serializers import CustomUserSerializer
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .fields import ImageVariantField, StreamedBase64ImageField
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .relations import CART, FAVORITES, get_relations
+from .signals import recipe_ingredients_rewrite
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -22,6 +25,7 @@ class IngredientSerialiser(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerialiser(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name', read_only=True)
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit', read_only=True
@@ -43,11 +47,15 @@ class RecipeIngredientCreate(RecipeIngredientSerialiser):
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True)
-    ingredients = RecipeIngredientSerialiser(many=True)
+    """
+    Сериализатор записи рецептов. Теги и ингредиенты проверяются
+    одним запросом in_bulk на список, при обновлении ингредиенты
+    сравниваются с сохранёнными и меняются только отличающиеся строки.
+    """
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = RecipeIngredientCreate(many=True)
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = StreamedBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -56,102 +64,128 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'tags',
             'author',
             'ingredients',
-            'is_favorited',
-            'is_in_shopping_cart',
             'name',
             'image',
             'text',
             'cooking_time',
         ]
 
-    def validate(self, data):
-        ingredients = data['ingredients']
-        ingredients_list = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredients_list:
-                raise serializers.ValidationError({
-                    'ingredients': 'Ингредиенты должны быть уникальными!'
-                })
-            ingredients_list.append(ingredient_id)
-            amount = ingredient['amount']
-            if int(amount) <= 0:
-                raise serializers.ValidationError({
-                    'amount': 'Количество ингредиента должно быть больше нуля!'
-                })
-
-        tags = data['tags']
-        if not tags:
-            raise serializers.ValidationError({
-                'tags': 'Нужно выбрать хотя бы один тэг!'
-            })
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError({
-                    'tags': 'Тэги должны быть уникальными!'
-                })
-            tags_list.append(tag)
-
-        cooking_time = data['cooking_time']
-        if int(cooking_time) <= 0:
-            raise serializers.ValidationError({
-                'cooking_time': 'Время приготовления должно быть больше 0!'
-            })
-        return data
-
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=request.user, recipe=obj).exists()
+    @staticmethod
+    def resolve_ids(model, ids, message):
+        """Объекты model по списку id одним запросом, в порядке ids."""
+        objects = model.objects.in_bulk(ids)
+        missing = [str(pk) for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                message.format(ids=', '.join(missing))
+            )
+        return [objects[pk] for pk in ids]
 
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+    def validate_tags(self, tags):
+        if not tags:
+            raise serializers.ValidationError(
+                'Нужно выбрать хотя бы один тэг!'
+            )
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError('Тэги должны быть уникальными!')
+        return self.resolve_ids(Tag, tags, 'Тэгов с id {ids} не существует')
 
-    @staticmethod
-    def create_ingredients(ingredients, recipe):
-        ingredients_list = []
-        for ingredient in ingredients:
-            new_ingredient = RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'],
+    def validate_ingredients(self, ingredients):
+        if not ingredients:
+            raise serializers.ValidationError(
+                'Нужно выбрать хотя бы один ингредиент!'
+            )
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ингредиенты должны быть уникальными!'
             )
-            ingredients_list.append(new_ingredient)
-        return RecipeIngredient.objects.bulk_create(ingredients_list)
+        objects = self.resolve_ids(
+            Ingredient, ids, 'Ингредиентов с id {ids} не существует'
+        )
+        return {
+            ingredient.id: item['amount']
+            for ingredient, item in zip(objects, ingredients)
+        }
+
+    def validate_cooking_time(self, cooking_time):
+        if cooking_time <= 0:
+            raise serializers.ValidationError(
+                'Время приготовления должно быть больше 0!'
+            )
+        return cooking_time
 
     @staticmethod
-    def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
-
+    def save_ingredients(recipe, amounts, existing=()):
+        """
+        Приводит ингредиенты рецепта к amounts ({id ингредиента:
+        количество}): удаляет лишние, меняет количество у изменившихся
+        и добавляет новые, не трогая совпадающие строки.
+        """
+        existing = {item.ingredient_id: item for item in existing}
+        removed = [item.pk for ingredient_id, item in existing.items()
+                   if ingredient_id not in amounts]
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        with recipe_ingredients_rewrite():
+            if removed:
+                RecipeIngredient.objects.filter(pk__in=removed).delete()
+            if changed:
+                RecipeIngredient.objects.bulk_update(changed, ['amount'])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in existing
+            ])
+
+    @transaction.atomic
     def create(self, validated_data):
-        author = self.context.get('request').user
         tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_tags(tags, recipe)
-        self.create_ingredients(ingredients, recipe)
+        amounts = validated_data.pop('ingredients')
+        recipe = Recipe.objects.create(
+            author=self.context['request'].user, **validated_data
+        )
+        recipe.tags.add(*tags)
+        self.save_ingredients(recipe, amounts)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
+        # Рецепт сохраняется последним: его post_save сбрасывает кэши и
+        # поисковые индексы. delete() строк шлёт post_delete на каждую
+        # строку, поэтому save_ingredients их обработчики отключает.
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        if 'ingredients' in validated_data:
+            self.save_ingredients(
+                instance, validated_data.pop('ingredients'),
+                instance.recipe_ingredient.all(),
+            )
         return super().update(instance, validated_data)
 
+    def to_representation(self, instance):
+        recipe = Recipe.objects.with_related().get(pk=instance.pk)
+        return RecipeReadSerializer(recipe, context=self.context).data
+
 
-class RecipeReadSerializer(RecipeWriteSerializer):
+class RecipeReadSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор чтения рецептов.
+    Ожидает queryset из Recipe.objects.with_related().
+    """
     tags = TagSerializer(read_only=True, many=True)
     author = CustomUserSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField()
+    ingredients = RecipeIngredientSerialiser(
+        source='recipe_ingredient', many=True, read_only=True)
+    image = ImageVariantField(variant='large')
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -160,55 +194,57 @@ class RecipeReadSerializer(RecipeWriteSerializer):
             'tags',
             'author',
             'ingredients',
+            'is_favorited',
+            'is_in_shopping_cart',
             'name',
+            'image',
             'text',
             'cooking_time',
         ]
 
+    def get_is_favorited(self, obj):
+        return get_relations(self.context.get('request')).has(
+            FAVORITES, obj.pk)
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    user = serializers.IntegerField(source='user.id')
-    recipe = serializers.IntegerField(source='recipe.id')
-
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
+    def get_is_in_shopping_cart(self, obj):
+        return get_relations(self.context.get('request')).has(CART, obj.pk)
 
-    def validate(self, data):
-        user = data['user']['id']
-        recipe = data['recipe']['id']
-        if Favorite.objects.filter(user=user, recipe__id=recipe).exists():
-            raise serializers.ValidationError(
-                {'errors': 'Нельзя повторно добавить в избранное'}
-            )
-        return data
 
-    def create(self, validated_data):
-        user = validated_data["user"]
-        recipe = validated_data["recipe"]
-        Favorite.objects.get_or_create(user=user, recipe=recipe)
-        return validated_data
+class CookRecipeSerializer(RecipeReadSerializer):
+    """Рецепт из подбора по ингредиентам с числом совпавших и недостающих."""
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
 
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + [
+            'matched_ingredients',
+            'missing_ingredients',
+        ]
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    user = serializers.IntegerField(source='user.id')
-    recipe = serializers.IntegerField(source='recipe.id')
 
-    class Meta:
-        model = ShoppingCart
-        fields = '__all__'
+class RecipeBatchSerializer(serializers.Serializer):
+    """Списки id рецептов, которые нужно добавить и убрать."""
+    add = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list,
+        max_length=settings.RECIPE_BATCH_LIMIT,
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list,
+        max_length=settings.RECIPE_BATCH_LIMIT,
+    )
 
     def validate(self, data):
-        user = data['user']['id']
-        recipe = data['recipe']['id']
-        if ShoppingCart.objects.filter(user=user, recipe__id=recipe).exists():
+        add, remove = data['add'], data['remove']
+        if not add and not remove:
             raise serializers.ValidationError(
-                {"errors": "Вы уже добавили рецепт в корзину"}
+                {'errors': 'Передайте id рецептов в add или remove'}
+            )
+        if len(set(add)) != len(add) or len(set(remove)) != len(remove):
+            raise serializers.ValidationError(
+                {'errors': 'id рецептов не должны повторяться'}
+            )
+        if set(add) & set(remove):
+            raise serializers.ValidationError(
+                {'errors': 'Рецепт не может быть сразу в add и remove'}
             )
         return data
-
-    def create(self, validated_data):
-        user = validated_data["user"]
-        recipe = validated_data["recipe"]
-        ShoppingCart.objects.get_or_create(user=user, recipe=recipe)
-        return validated_data
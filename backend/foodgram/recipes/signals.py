@@ -0,0 +1,226 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from users.models import Follow
+
+from . import response_cache
+from .cook_index import record_change
+from .counters import change_counter
+from .exports import invalidate_all_shopping_lists, invalidate_shopping_lists
+from .images import needs_variants, schedule_variants
+from .ingredient_index import ingredient_index
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .relations import CART, FAVORITES, FOLLOWING, RELATIONS, update_relations
+from .reference import ingredients_document, tags_document
+from .search import update_search_index
+
+User = get_user_model()
+
+_local = threading.local()
+
+
+@contextmanager
+def recipe_ingredients_rewrite():
+    """
+    Внутри блока сигналы строк RecipeIngredient не обрабатываются: при
+    правке всех ингредиентов рецепта кэши и индексы сбрасывает post_save
+    рецепта, который сохраняется после строк. Иначе delete() строк
+    запускает обработчики на каждую удалённую строку.
+    """
+    previous = getattr(_local, 'rewrite', False)
+    _local.rewrite = True
+    try:
+        yield
+    finally:
+        _local.rewrite = previous
+
+
+def _ingredients_rewrite():
+    return getattr(_local, 'rewrite', False)
+
+
+# Списки покупок сбрасываются после коммита, как и остальные кэши:
+# иначе параллельная выгрузка сохранит документ по старым строкам.
+
+def _invalidate_shopping_lists(user_ids):
+    transaction.on_commit(lambda: invalidate_shopping_lists(user_ids))
+
+
+def _invalidate_recipe_customers(recipe_id):
+    _invalidate_shopping_lists(list(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+    ))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    _invalidate_shopping_lists([instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if _ingredients_rewrite():
+        return
+    _invalidate_recipe_customers(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    # Строки ингредиентов сериализатор правит без обработки их сигналов
+    # и сохраняет рецепт уже после них.
+    if not created:
+        _invalidate_recipe_customers(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def recipe_counter_changed(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_save and not created:
+        return
+    field = 'favorites_count' if sender is Favorite else 'in_carts_count'
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id),
+        field, 1 if created else -1, score_dirty=True,
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def author_counter_changed(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_save and not created:
+        return
+    change_counter(
+        User.objects.filter(pk=instance.author_id),
+        'recipes_count', 1 if created else -1,
+    )
+
+
+# Поисковый документ строится после коммита: сериализатор создаёт
+# ингредиенты через bulk_create уже после сохранения рецепта, а
+# update() сохраняет рецепт после них, так что сигнала рецепта хватает.
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_search_changed(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: update_search_index([pk]))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = list(RecipeIngredient.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True))
+    transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_cook_index_changed(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: record_change(pk))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_cook_index_changed(sender, instance, **kwargs):
+    if _ingredients_rewrite():
+        return
+    recipe_id = instance.recipe_id
+    transaction.on_commit(lambda: record_change(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, **kwargs):
+    # Варианты записываются через update(), поэтому сигнал не зацикливается.
+    if needs_variants(instance):
+        transaction.on_commit(lambda: schedule_variants(instance))
+
+
+# Кэш ответов для анонимов сбрасывается после коммита, чтобы параллельный
+# запрос не закэшировал ещё не закоммиченные данные под новым поколением.
+
+def _invalidate_recipe_responses(pk):
+    transaction.on_commit(lambda: response_cache.invalidate_recipe(pk))
+
+
+def _invalidate_all_responses():
+    transaction.on_commit(response_cache.invalidate_all)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    _invalidate_recipe_responses(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    if _ingredients_rewrite():
+        return
+    _invalidate_recipe_responses(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        _invalidate_all_responses()
+    else:
+        _invalidate_recipe_responses(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    tags_document.invalidate_on_commit()
+    _invalidate_all_responses()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_all_shopping_lists)
+    transaction.on_commit(ingredient_index.invalidate)
+    ingredients_document.invalidate_on_commit()
+    _invalidate_all_responses()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Новый пользователь ещё не автор, а из остальных полей в ответах
+    # с рецептами видны только PUBLIC_FIELDS: пароль, вход и прочее
+    # кэш не сбрасывают.
+    if created:
+        return
+    if update_fields is not None and not (
+        set(update_fields) & set(User.PUBLIC_FIELDS)
+    ):
+        return
+    if instance.public_fields_changed():
+        _invalidate_all_responses()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if instance.recipes_count:
+        _invalidate_all_responses()
+
+
+# Закэшированные связи пользователя правятся, а не загружаются заново.
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def user_relation_changed(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_save and not created:
+        return
+    kind = {Favorite: FAVORITES, ShoppingCart: CART, Follow: FOLLOWING}[sender]
+    pk = getattr(instance, RELATIONS[kind][1])
+    if created:
+        update_relations(instance.user_id, kind, add=[pk])
+    else:
+        update_relations(instance.user_id, kind, remove=[pk])
@@ -0,0 +1,374 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from foodgram.renderers import FastJSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from users.fast_read import AUTHOR_FIELDS, subscription_data
+from users.models import Follow
+from users.serializers import ShowFollowSerializer
+
+from .fast_read import RECIPE_FIELDS, recipe_data
+from .generations import get_generation
+from .images import SyncQueue, get_queue
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart)
+from .response_cache import SHARED_GENERATION_KEY
+from .serializers import RecipeReadSerializer
+
+User = get_user_model()
+
+LIST_URL = '/api/recipes/'
+SMALL_PAGE = 6
+LARGE_PAGE = 40
+# Так EXPLAIN SQLite и PostgreSQL пишут чтение по индексу.
+INDEX_SCANS = ('USING INDEX', 'USING COVERING INDEX', 'Index Scan',
+               'Index Only Scan')
+# Без варианта - как на странице рецепта, medium - как в ленте.
+IMAGE_VARIANTS = (None, 'medium')
+RECIPES_LIMITS = (None, 3)
+
+
+def generate_data(**options):
+    call_command('generate_data', stdout=StringIO(), **options)
+
+
+def render(data):
+    return FastJSONRenderer().render(data).decode()
+
+
+def context(user, **extra):
+    # Свой запрос на каждую проверку: связи кэшируются в запросе.
+    request = APIRequestFactory().get('/', SERVER_NAME='localhost')
+    request.user = user
+    return {'request': request, **extra}
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов ленты не зависит от размера страницы."""
+
+    # Поколения кэша, COUNT и страница, теги и ингредиенты; для
+    # пользователя ещё поколение и UNION его связей.
+    ANONYMOUS_QUERIES = 5
+    USER_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=10, recipes=5, follows=3, favorites=10, cart=5)
+        cls.user = User.objects.filter(favorite__isnull=False).first()
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assert_list_queries(self, queries):
+        # Первый запрос создаёт счётчики поколений.
+        self.client.get(LIST_URL)
+        for limit in (SMALL_PAGE, LARGE_PAGE):
+            # Кэш ответов и связей пользователя живёт между запросами.
+            cache.clear()
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(LIST_URL, {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_list_queries(self.ANONYMOUS_QUERIES)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(self.USER_QUERIES)
+
+    @override_settings(FAST_READ={})
+    def test_serializer_path(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(self.USER_QUERIES)
+
+
+class RecipeIngredientsUpdateQueriesTest(TestCase):
+    """
+    Число запросов PATCH с ингредиентами не зависит от того, сколько
+    строк удалено: кэши и индексы сбрасывает сохранение рецепта.
+    """
+
+    INGREDIENTS = 30
+    # Рецепт и ингредиенты, правка строк, сохранение рецепта, ответ со
+    # связями пользователя; после коммита - поиск, журнал индекса подбора
+    # и поколения кэшей. От числа удалённых строк не зависит.
+    QUERIES = 26
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=2, recipes=1, ingredients=cls.INGREDIENTS,
+                      follows=0, favorites=0, cart=1)
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.recipe.author)
+        self.url = f'{LIST_URL}{self.recipe.pk}/'
+        self.rows = list(RecipeIngredient.objects.filter(
+            recipe=self.recipe
+        ).order_by('id').values('ingredient_id', 'amount'))
+
+    def assert_patch_queries(self, rows):
+        ingredients = [
+            {'id': row['ingredient_id'], 'amount': row['amount'] + 1}
+            for row in rows
+        ]
+        with self.assertNumQueries(self.QUERIES):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    self.url, {'ingredients': ingredients}, format='json'
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), len(rows))
+
+    def test_remove_some(self):
+        self.assert_patch_queries(self.rows[5:])
+
+    def test_remove_all_but_one(self):
+        self.assert_patch_queries(self.rows[:1])
+
+
+class DerivedFieldsSaveTest(TestCase):
+    """Сохранение устаревшей копии не затирает счётчики из сигналов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=2, recipes=1, follows=0, favorites=1, cart=1)
+
+    def test_user_recipes_count(self):
+        stale = User.objects.filter(recipes__isnull=False).first()
+        Recipe.objects.create(
+            author=stale, name='Новый', text='Текст', cooking_time=1
+        )
+        stale.first_name = 'Другое'
+        stale.set_password('new-password')
+        stale.save()
+        user = User.objects.get(pk=stale.pk)
+        self.assertEqual(user.recipes_count, stale.recipes_count + 1)
+        self.assertEqual(user.first_name, 'Другое')
+        self.assertTrue(user.check_password('new-password'))
+
+    def test_recipe_counters(self):
+        stale = Recipe.objects.filter(favorites_count=0).first()
+        Favorite.objects.create(
+            user=User.objects.exclude(favorite__recipe=stale).first(),
+            recipe=stale,
+        )
+        stale.name = 'Другое'
+        stale.save()
+        recipe = Recipe.objects.get(pk=stale.pk)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.name, 'Другое')
+
+
+class UserResponseCacheTest(TestCase):
+    """Кэш ответов для анонимов сбрасывают только видимые поля авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=2, recipes=1, follows=0, favorites=0, cart=0)
+
+    def setUp(self):
+        self.author = User.objects.filter(recipes__isnull=False).first()
+
+    def assert_invalidates(self, expected, action):
+        before = get_generation(SHARED_GENERATION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+        self.assertEqual(
+            get_generation(SHARED_GENERATION_KEY) != before, expected
+        )
+
+    def test_signup(self):
+        self.assert_invalidates(False, lambda: User.objects.create_user(
+            email='new@example.com', username='new', password='password',
+            first_name='Имя', last_name='Фамилия',
+        ))
+
+    def test_password(self):
+        def change():
+            self.author.set_password('new-password')
+            self.author.save()
+        self.assert_invalidates(False, change)
+
+    def test_public_field(self):
+        def change():
+            self.author.username = 'renamed'
+            self.author.save()
+        self.assert_invalidates(True, change)
+        # Повторное сохранение без изменений кэш уже не трогает.
+        self.assert_invalidates(False, self.author.save)
+
+    def test_delete(self):
+        user = User.objects.create_user(
+            email='new@example.com', username='new', password='password',
+        )
+        self.assert_invalidates(False, user.delete)
+        self.assert_invalidates(True, self.author.delete)
+
+
+@override_settings(IMAGE_PIPELINE={'QUEUE': 'recipes.images.SyncQueue'})
+class ImageVariantsQueueTest(TestCase):
+    """Ошибки построения вариантов картинки не ломают сохранение."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=1, recipes=1, follows=0, favorites=0, cart=0)
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        get_queue.cache_clear()
+        self.addCleanup(get_queue.cache_clear)
+
+    def test_sync_queue_logs_failure(self):
+        def fail():
+            raise OSError('broken')
+        with self.assertLogs('recipes.images', 'ERROR'):
+            SyncQueue().enqueue(fail)
+
+    def test_missing_source(self):
+        client = APIClient()
+        client.force_authenticate(self.recipe.author)
+        with self.assertLogs('recipes.images', 'WARNING') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch(
+                    f'{LIST_URL}{self.recipe.pk}/', {'name': 'Другое'},
+                    format='json',
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.recipe.image.name, logs.output[0])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+
+class IndexUsageTest(TestCase):
+    """Индексы из миграций есть в базе, и основные запросы их используют."""
+
+    INDEXES = {
+        'recipes_recipe': ('recipe_feed_idx', 'recipe_author_idx'),
+        'recipes_recipeingredient': ('unique_recipe_ingredient',),
+        'recipes_favorite': ('unique_favorites',),
+        'recipes_shoppingcart': ('unique_shopping_cart',),
+        'users_follow': ('follow_user_idx', 'unique_follow'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=20, recipes=5, follows=5)
+        follow = Follow.objects.first()
+        cls.user_id = follow.user_id
+        cls.author_id = follow.author_id
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # На маленькой базе планировщик выберет Seq Scan, а проверить
+            # нужно, что индекс подходит к запросу.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assert_uses_index(self, queryset, index=None):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(scan in plan for scan in INDEX_SCANS),
+            f'Запрос читает таблицу без индекса:\n{plan}',
+        )
+        if index is not None:
+            self.assertIn(index, plan)
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            for table, indexes in self.INDEXES.items():
+                constraints = connection.introspection.get_constraints(
+                    cursor, table
+                )
+                for index in indexes:
+                    with self.subTest(index=index):
+                        self.assertIn(index, constraints)
+
+    def test_feed(self):
+        self.assert_uses_index(Recipe.objects.all()[:6], 'recipe_feed_idx')
+
+    def test_author_recipes(self):
+        self.assert_uses_index(
+            Recipe.objects.filter(author_id=self.author_id)[:6],
+            'recipe_author_idx',
+        )
+
+    def test_subscriptions(self):
+        self.assert_uses_index(
+            Follow.objects.filter(user_id=self.user_id)[:6],
+            'follow_user_idx',
+        )
+
+    def test_user_recipe_lookups(self):
+        # На SQLite уникальное ограничение - автоиндекс таблицы со своим
+        # именем, поэтому проверяется только чтение по индексу.
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                self.assert_uses_index(model.objects.filter(
+                    user_id=self.user_id, recipe_id=1
+                ))
+
+    def test_ingredient_trigram_search(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Триграммный индекс есть только в PostgreSQL')
+        self.assert_uses_index(
+            Ingredient.objects.filter(name__icontains='ингр'),
+            'ingredient_name_trgm_idx',
+        )
+
+
+class ReadSerializerContractTest(TestCase):
+    """
+    Быстрый путь чтения (recipes.fast_read, users.fast_read) отдаёт тот же
+    JSON, что и сериализаторы DRF, для анонима и пользователей со связями.
+    """
+
+    USERS = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_data(users=10, recipes=5, follows=3, favorites=10, cart=5)
+        cls.users = [AnonymousUser()] + list(User.objects.annotate(
+            relations=(Count('favorite', distinct=True)
+                       + Count('follower', distinct=True)),
+        ).order_by('-relations', 'id')[:cls.USERS])
+
+    def test_recipes(self):
+        for user in self.users:
+            for variant in IMAGE_VARIANTS:
+                extra = {'image_variant': variant} if variant else {}
+                with self.subTest(user=str(user), variant=variant):
+                    slow = RecipeReadSerializer(
+                        Recipe.objects.with_related(), many=True,
+                        context=context(user, **extra),
+                    ).data
+                    fast = recipe_data(
+                        list(Recipe.objects.values(*RECIPE_FIELDS)),
+                        context(user, **extra),
+                    )
+                    self.assertEqual(render(fast), render(slow))
+
+    def test_subscriptions(self):
+        for user in self.users[1:]:
+            authors = User.objects.filter(following__user=user)
+            self.assertTrue(authors.exists())
+            for limit in RECIPES_LIMITS:
+                with self.subTest(user=str(user), recipes_limit=limit):
+                    slow = ShowFollowSerializer(
+                        authors, many=True,
+                        context=context(user, recipes_limit=limit),
+                    ).data
+                    fast = subscription_data(
+                        list(authors.values(*AUTHOR_FIELDS)),
+                        context(user, recipes_limit=limit),
+                    )
+                    self.assertEqual(render(fast), render(slow))
@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+FORMAT_VERSION = 1
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def is_gzip(path):
+    if path.endswith('.gz'):
+        return True
+    try:
+        with open(path, 'rb') as file:
+            return file.read(2) == GZIP_MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def open_lines(path):
+    """Построчное чтение NDJSON, сжатого gzip или нет."""
+    if is_gzip(path):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def dump_line(record):
+    return json.dumps(
+        record, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':'),
+    ) + '\n'
+
+
+def append_block(path, lines, compress):
+    """
+    Дописывает строки в конец файла отдельным блоком (при compress -
+    отдельным членом gzip) и возвращает размер файла после записи.
+    По этому размеру можно отрезать недописанный хвост при возобновлении.
+    """
+    with open(path, 'ab') as raw:
+        data = ''.join(lines).encode()
+        if compress:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as file:
+                file.write(data)
+        else:
+            raw.write(data)
+        raw.flush()
+        os.fsync(raw.fileno())
+        return raw.tell()
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(temporary, path)
+
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def assign_inserted_pks(model, objects):
+    """
+    Проставляет pk объектам после bulk_create там, где база их не
+    возвращает (SQLite). Вызывается в той же транзакции: пока она
+    открыта, SQLite не пустит другого писателя, и последние
+    len(objects) id таблицы принадлежат этой вставке.
+    """
+    if connection.features.can_return_rows_from_bulk_insert or not objects:
+        return
+    pks = model.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    )[:len(objects)]
+    for obj, pk in zip(objects, reversed(list(pks))):
+        obj.pk = pk
@@ -1,13 +1,40 @@
+from django.conf import settings
 from django.urls import include, path
+from foodgram.offload import CPU_POOL, READ_POOL, offloaded
 from rest_framework.routers import DefaultRouter
 
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
 
+# Под ASGI эти маршруты выполняются в ограниченных пулах потоков:
+# чтение - в пуле по числу соединений с базой, PDF и загрузка картинок
+# (запросы с телом) - в маленьком пуле под CPU.
+ASYNC_ROUTES = {
+    'recipes-list': READ_POOL,
+    'recipes-detail': READ_POOL,
+    'recipes-cook': READ_POOL,
+    'recipes-download-shopping-cart': CPU_POOL,
+    'ingredients-list': READ_POOL,
+    'tags-list': READ_POOL,
+}
+
 router = DefaultRouter()
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('tags', TagViewSet, basename='tags')
 
+
+def offload_routes(patterns):
+    for pattern in patterns:
+        pool = ASYNC_ROUTES.get(pattern.name)
+        if pool is not None:
+            pattern.callback = offloaded(pattern.callback, pool)
+    return patterns
+
+
+routes = router.urls
+if settings.ASYNC_VIEWS:
+    routes = offload_routes(routes)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(routes)),
 ]
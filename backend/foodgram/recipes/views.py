@@ -1,27 +1,59 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
 from django_filters import rest_framework as filters
-from reportlab.pdfbase import pdfmetrics
-from django.db.models import Sum
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from users.serializers import RecipeSubSerializer
 
+from . import response_cache
+from .batch import apply_batch
+from .cook_index import cook_index, search_database
+from .exports import EXPORT_FORMATS, shopping_list_response
+from .fast_read import RECIPE_FIELDS, fast_read_enabled, recipe_data
 from .filters import IngredientNameFilter, RecipeFilter
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
-from .paginators import CustomPageNumberPaginator
+from .ingredient_index import ingredient_index
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .paginators import CustomPageNumberPaginator, RecipePaginator
+from .parsers import RecipeJSONParser
 from .permissions import IsRecipeOwnerOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerialiser,
-                          RecipeReadSerializer, RecipeWriteSerializer,
-                          ShoppingCartSerializer, TagSerializer)
+from .reference import ingredients_document, tags_document
+from .serializers import (CookRecipeSerializer, IngredientSerialiser,
+                          RecipeBatchSerializer, RecipeReadSerializer,
+                          RecipeWriteSerializer, TagSerializer)
 
 User = get_user_model()
 
+# В ленте карточки мельче, чем на странице рецепта.
+LIST_ACTIONS = ('list', 'cook')
+LIST_IMAGE_VARIANT = 'medium'
+
+
+def parse_cook_params(query_params):
+    """
+    Достаёт id ингредиентов (?ingredients=1,2 или ?ingredients=1&...)
+    и max_missing. Возвращает None, если параметры неверные.
+    """
+    try:
+        ingredient_ids = {
+            int(value)
+            for values in query_params.getlist('ingredients')
+            for value in values.split(',') if value
+        }
+        max_missing = query_params.get('max_missing')
+        if max_missing is not None:
+            max_missing = int(max_missing)
+    except ValueError:
+        return None
+    if not ingredient_ids or (max_missing is not None and max_missing < 0):
+        return None
+    return ingredient_ids, max_missing
+
 
 class ListRetrieveModelViewSet(
         mixins.ListModelMixin,
@@ -35,12 +67,21 @@ class ListRetrieveModelViewSet(
     pass
 
 
+def wants_json(request):
+    return request.accepted_renderer.format == 'json'
+
+
 class TagViewSet(ListRetrieveModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if wants_json(request):
+            return tags_document.response(request)
+        return super().list(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
@@ -49,13 +90,27 @@ class IngredientViewSet(viewsets.ModelViewSet):
     pagination_class = None
     filter_class = IngredientNameFilter
 
+    def list(self, request, *args, **kwargs):
+        if not request.query_params and wants_json(request):
+            return ingredients_document.response(request)
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if set(request.query_params) == {'name'}:
+            result = ingredient_index.search(name, limit)
+            if result is not None:
+                return Response(result)
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        return Response(self.get_serializer(queryset, many=True).data)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
     filter_backends = (filters.DjangoFilterBackend,)
     filter_class = RecipeFilter
     permission_classes = (IsRecipeOwnerOrReadOnly,)
-    pagination_class = CustomPageNumberPaginator
+    pagination_class = RecipePaginator
+    parser_classes = (RecipeJSONParser, FormParser, MultiPartParser)
     filterset_fields = (
         'tags',
         'author',
@@ -63,84 +118,188 @@ class RecipeViewSet(viewsets.ModelViewSet):
         'is_in_shopping_cart'
     )
 
+    def get_queryset(self):
+        return Recipe.objects.with_related()
+
+    def cached_response(self, key, handler, request, *args, **kwargs):
+        """
+        Для анонима флаги рецепта всегда False, поэтому ответ зависит
+        только от данных и его можно отдавать из кэша.
+        """
+        data = response_cache.read(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.store(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        handler = super().list
+        if fast_read_enabled('RECIPE_LIST'):
+            handler = self.fast_list
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        return self.cached_response(
+            response_cache.list_key(request), handler,
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = super().retrieve
+        if fast_read_enabled('RECIPE_DETAIL'):
+            handler = self.fast_retrieve
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        return self.cached_response(
+            response_cache.detail_key(kwargs['pk']), handler,
+            request, *args, **kwargs
+        )
+
+    def fast_list(self, request, *args, **kwargs):
+        """list() по строкам values() без RecipeReadSerializer."""
+        queryset = self.filter_queryset(
+            Recipe.objects.all()
+        ).values(*RECIPE_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            recipe_data(page, self.get_serializer_context())
+        )
+
+    def fast_retrieve(self, request, pk, *args, **kwargs):
+        row = get_object_or_404(Recipe.objects.values(*RECIPE_FIELDS), pk=pk)
+        return Response(
+            recipe_data([row], self.get_serializer_context())[0]
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in LIST_ACTIONS:
+            context['image_variant'] = LIST_IMAGE_VARIANT
+        return context
+
     def get_serializer_class(self):
         if self.request.method in ['GET']:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
     @staticmethod
-    def post_method_for_actions(request, pk, serializers):
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializers(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+    def post_method_for_actions(request, pk, model, message):
+        recipe = get_object_or_404(Recipe, id=pk)
+        try:
+            # Повтор отсекает уникальное ограничение, а не SELECT перед
+            # INSERT; savepoint нужен, чтобы ошибка не ломала транзакцию.
+            with transaction.atomic():
+                model.objects.create(user=request.user, recipe=recipe)
+        except IntegrityError:
+            return Response(
+                {'errors': message}, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = RecipeSubSerializer(
+            recipe, context={'request': request}
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
     def delete_method_for_actions(request, pk, model):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        model_obj = get_object_or_404(model, user=user, recipe=recipe)
-        model_obj.delete()
+        deleted, _ = model.objects.filter(
+            user=request.user, recipe_id=pk
+        ).delete()
+        if not deleted:
+            raise NotFound()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def batch_method_for_actions(request, model):
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_batch(
+            model, request.user, **serializer.validated_data
+        )
+        return Response({'results': results})
+
     @action(detail=True, methods=["POST"],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
         return self.post_method_for_actions(
-            request=request, pk=pk, serializers=FavoriteSerializer)
+            request=request, pk=pk, model=Favorite,
+            message='Нельзя повторно добавить в избранное')
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
         return self.delete_method_for_actions(
             request=request, pk=pk, model=Favorite)
 
+    @action(detail=False, methods=['post'], url_path='favorite',
+            url_name='favorite-batch',
+            permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        """Добавляет и убирает из избранного сразу несколько рецептов."""
+        return self.batch_method_for_actions(request, Favorite)
+
     @action(detail=True, methods=["POST"],
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
         return self.post_method_for_actions(
-            request=request, pk=pk, serializers=ShoppingCartSerializer)
+            request=request, pk=pk, model=ShoppingCart,
+            message='Вы уже добавили рецепт в корзину')
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
         return self.delete_method_for_actions(
             request=request, pk=pk, model=ShoppingCart)
 
+    @action(detail=False, methods=['post'], url_path='shopping_cart',
+            url_name='shopping-cart-batch',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        """Добавляет и убирает из списка покупок сразу несколько рецептов."""
+        return self.batch_method_for_actions(request, ShoppingCart)
+
+    @action(detail=False, methods=['get'])
+    def cook(self, request):
+        """
+        Рецепты, которые можно приготовить из ингредиентов ?ingredients=,
+        по убыванию доли имеющихся ингредиентов; ?max_missing=N оставляет
+        рецепты, где не хватает не больше N ингредиентов.
+        """
+        params = parse_cook_params(request.query_params)
+        if params is None:
+            return Response(
+                {'errors': 'Укажите id ингредиентов в ingredients и '
+                           'неотрицательное max_missing'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = settings.COOK_SEARCH_LIMIT
+        ranked = cook_index.search(*params, limit)
+        if ranked is None:
+            ranked = search_database(*params, limit)
+        paginator = CustomPageNumberPaginator()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        result = []
+        for recipe_id, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_ingredients = matched
+            recipe.missing_ingredients = total - matched
+            result.append(recipe)
+        serializer = CookRecipeSerializer(
+            result, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        final_list = {}
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__carts__user=request.user).values_list(
-            'recipe__name',
-            'ingredient__name',
-            'ingredient__measurement_unit').order_by(
-            'ingredients__name').annotate(
-            ingredients_total=Sum('amount')
-        )
-        for item in ingredients:
-            name = item[0]
-            if name not in final_list:
-                final_list[name] = {
-                    'measurement_unit': item[1],
-                    'amount': item[2],
-                    'recipe': item[3]
-                }
-        pdfmetrics.registerFont(
-            TTFont('Handicraft', 'data/Handicraft.ttf', 'UTF-8'))
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_list.pdf"')
-        page = canvas.Canvas(response)
-        page.setFont('Handicraft', size=24)
-        page.drawString(200, 800, 'Список покупок')
-        page.setFont('Handicraft', size=16)
-        height = 750
-        for i, (name, data) in enumerate(final_list.items(), 1):
-            page.drawString(75, height, (f'{data["recipe"]}:'
-                                         f'{i}. {name} - {data["amount"]} '
-                                         f'{data["measurement_unit"]}'))
-            height -= 25
-        page.showPage()
-        page.save()
-        return response
+        file_format = request.query_params.get('type', 'pdf')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                           f'{", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return shopping_list_response(request, file_format)
@@ -5,7 +5,9 @@ from users import models
 
 @admin.register(models.CustomUser)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('last_name', 'first_name', 'username', 'email')
+    list_display = (
+        'last_name', 'first_name', 'username', 'email', 'recipes_count'
+    )
     list_filter = ('username', 'email')
 
 
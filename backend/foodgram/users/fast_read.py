@@ -0,0 +1,39 @@
+from collections import defaultdict
+
+from recipes.fast_read import SHORT_RECIPE_FIELDS, short_recipe_data
+from recipes.models import Recipe
+
+AUTHOR_FIELDS = (
+    'email', 'id', 'username', 'first_name', 'last_name', 'recipes_count',
+)
+
+
+def subscription_data(rows, context):
+    """
+    Данные ShowFollowSerializer по строкам User.objects.values(
+    *AUTHOR_FIELDS) авторов, на которых подписан пользователь.
+    """
+    request = context.get('request')
+    recipes = defaultdict(list)
+    recipe_rows = Recipe.objects.filter(
+        author_id__in=[row['id'] for row in rows]
+    ).latest_per_author(
+        context.get('recipes_limit')
+    ).values(*SHORT_RECIPE_FIELDS)
+    for recipe in recipe_rows:
+        recipes[recipe['author_id']].append(
+            short_recipe_data(recipe, request)
+        )
+    return [
+        {
+            'email': row['email'],
+            'id': row['id'],
+            'username': row['username'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'is_subscribed': True,
+            'recipes': recipes[row['id']],
+            'recipes_count': row['recipes_count'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-created_at'], name='follow_user_idx'),
+        ),
+    ]
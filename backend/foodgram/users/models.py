@@ -6,12 +6,20 @@ from django.db.models import constraints
 class CustomUser(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    # Счётчик меняют F()-обновления из сигналов рецептов.
+    DERIVED_FIELDS = ('recipes_count',)
+    # Поля автора, которые видны в ответах с рецептами.
+    PUBLIC_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
     email = models.EmailField(unique=True, verbose_name='Почта')
     username = models.CharField(
         max_length=150, unique=True, verbose_name='Логин'
     )
     first_name = models.CharField(max_length=150, verbose_name='Имя')
     last_name = models.CharField(max_length=150, verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число рецептов'
+    )
 
     class Meta:
         ordering = ('username',)
@@ -21,6 +29,48 @@ class CustomUser(AbstractUser):
     def __str__(self) -> str:
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_public = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.PUBLIC_FIELDS
+        }
+        return instance
+
+    def public_fields_changed(self):
+        """
+        Изменились ли PUBLIC_FIELDS с загрузки из базы. Для объекта,
+        созданного не из базы, считается, что изменились.
+        """
+        loaded = getattr(self, '_loaded_public', None)
+        if loaded is None:
+            return True
+        # Отложенные и не тронутые поля в __dict__ не попадают.
+        return any(
+            name in self.__dict__
+            and (name not in loaded or loaded[name] != self.__dict__[name])
+            for name in self.PUBLIC_FIELDS
+        )
+
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет существующего пользователя без DERIVED_FIELDS: смена
+        пароля, правка в админке или вход иначе запишут счётчик рецептов,
+        загруженный раньше, и затрут параллельные F()-обновления.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        self._loaded_public = {
+            name: self.__dict__[name]
+            for name in self.PUBLIC_FIELDS if name in self.__dict__
+        }
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -46,6 +96,11 @@ class Follow(models.Model):
                 fields=['author', 'user'], name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at'], name='follow_user_idx'
+            )
+        ]
 
     def __str__(self) -> str:
         return f'{self.author}, {self.user}'
@@ -3,7 +3,9 @@ from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 from rest_framework.generics import get_object_or_404
 
+from recipes.fields import ImageVariantField
 from recipes.models import Recipe
+from recipes.relations import FOLLOWING, get_relations
 from .models import Follow
 
 User = get_user_model()
@@ -24,10 +26,10 @@ class CustomUserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=request.user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_relations(self.context.get('request')).has(
+            FOLLOWING, obj.pk)
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -60,6 +62,8 @@ class FollowSerializer(serializers.ModelSerializer):
 
 
 class RecipeSubSerializer(serializers.ModelSerializer):
+    image = ImageVariantField(variant='small')
+
     class Meta:
         model = Recipe
         fields = ["id", "name", "image", "cooking_time"]
@@ -82,5 +86,13 @@ class ShowFollowSerializer(CustomUserSerializer):
             'recipes_count',
         )
 
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = Recipe.objects.filter(author=obj).latest_per_author(
+                self.context.get('recipes_limit'))
+        return RecipeSubSerializer(
+            recipes, many=True, context=self.context).data
+
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
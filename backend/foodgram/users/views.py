@@ -1,14 +1,18 @@
 from django.views.generic import CreateView
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet
+from django.db.models import BooleanField, Prefetch, Value
 from django.urls import reverse_lazy
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from recipes.fast_read import fast_read_enabled
+from recipes.models import Recipe
+from recipes.paginators import CustomPageNumberPaginator
 from users.models import Follow
+from .fast_read import AUTHOR_FIELDS, subscription_data
 from .forms import CreationForm
 from .permissions import IsAuthorOnly
 from .serializers import FollowSerializer, ShowFollowSerializer
@@ -23,6 +27,32 @@ class SignUp(CreateView):
 
 
 class CustomUserViewSet(UserViewSet):
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    def get_follow_context(self):
+        context = self.get_serializer_context()
+        context['recipes_limit'] = self.get_recipes_limit()
+        return context
+
+    def with_recipes(self, authors):
+        """
+        Авторы подписок с последними recipes_limit рецептами:
+        фиксированное число запросов на страницу.
+        """
+        return authors.annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.latest_per_author(
+                self.get_recipes_limit()),
+            to_attr='latest_recipes',
+        ))
+
     @action(
         methods=['GET'],
         detail=False,
@@ -31,11 +61,21 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthorOnly,),
     )
     def subscriptions(self, request):
-        user = User.objects.filter(following__user=request.user)
-        paginator = PageNumberPagination()
+        authors = User.objects.filter(following__user=request.user)
+        paginator = CustomPageNumberPaginator()
         paginator.page_size = 6
-        page = paginator.paginate_queryset(user, request)
-        serializer = ShowFollowSerializer(page, many=True)
+        if fast_read_enabled('SUBSCRIPTIONS'):
+            page = paginator.paginate_queryset(
+                authors.values(*AUTHOR_FIELDS), request
+            )
+            return paginator.get_paginated_response(
+                subscription_data(page, self.get_follow_context())
+            )
+        page = paginator.paginate_queryset(
+            self.with_recipes(authors), request
+        )
+        serializer = ShowFollowSerializer(
+            page, many=True, context=self.get_follow_context())
         return paginator.get_paginated_response(serializer.data)
 
     @action(
@@ -52,7 +92,10 @@ class CustomUserViewSet(UserViewSet):
         if request.method == 'GET':
             serializer.is_valid(raise_exception=True)
             serializer.save(user=user)
-            serializer = ShowFollowSerializer(author)
+            serializer = ShowFollowSerializer(
+                self.with_recipes(User.objects.filter(pk=author.pk)).get(),
+                context=self.get_follow_context(),
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         obj = get_object_or_404(Follow, user=user, author__id=id)
         obj.delete()